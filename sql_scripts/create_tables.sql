@@ -5,8 +5,13 @@ CREATE TABLE zoo_keeper (
     zoo_id INT,
     favorite_monkey_id INT,
     dream_monkey_id INT,
+    version INT NOT NULL DEFAULT 1,
     PRIMARY KEY (id)
 );
 
 CREATE INDEX zoo_keeper_name ON zoo_keeper (name);
+CREATE INDEX zoo_keeper_zoo_id ON zoo_keeper (zoo_id);
+CREATE INDEX zoo_keeper_favorite_monkey_id ON zoo_keeper (favorite_monkey_id);
+CREATE INDEX zoo_keeper_dream_monkey_id ON zoo_keeper (dream_monkey_id);
+CREATE INDEX zoo_keeper_age ON zoo_keeper (age);
 
@@ -1,9 +1,10 @@
 
 
 class MockResponse(object):
-    def __init__(self, json_data, status_code):
+    def __init__(self, json_data, status_code, headers=None):
         self.json_data = json_data
         self.status_code = status_code
+        self.headers = headers or {}
 
     @property
     def ok(self):
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from tests.mock_requests import MockRequests
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MockZooServer(object):
+    """
+    serves MockRequests data over http on localhost, on a free port, from a background thread.
+
+    delay: seconds to wait before answering each request
+    requests: (method, path) of every request received
+    last_modified: the Last-Modified of every record. records also get an ETag, a hash of their body,
+                   and conditional requests that still match are answered 304
+    not_modified: 304s sent
+    """
+    def __init__(self):
+        self.delay = 0
+        self.requests = []
+        self.last_modified = 'Mon, 05 Oct 2026 10:00:00 GMT'
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), _create_request_handler(self))
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self._server.server_address[1])
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread.is_alive():
+            self._server.shutdown()
+        self._server.server_close()
+
+    def record(self, method, path):
+        with self._lock:
+            self.requests.append((method, path))
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def reset(self):
+        with self._lock:
+            self.requests = []
+            self.not_modified = 0
+        self.delay = 0
+
+
+def _create_request_handler(mock_server: MockZooServer):
+    class RequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self._respond(send_body=True)
+
+        def do_HEAD(self):
+            self._respond(send_body=False)
+
+        def _respond(self, send_body):
+            mock_server.record(self.command, self.path)
+            if mock_server.delay:
+                time.sleep(mock_server.delay)
+            mock_response = MockRequests.get(self.path)
+            body = json.dumps(mock_response.json()).encode()
+            etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+            if mock_response.status_code == 200 and self._is_not_modified(etag):
+                mock_server.record_not_modified()
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+
+            self.send_response(mock_response.status_code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            if mock_response.status_code == 200:
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', mock_server.last_modified)
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+
+        def _is_not_modified(self, etag):
+            if_none_match = self.headers.get('If-None-Match')
+            if if_none_match is not None:
+                return if_none_match == etag
+            return self.headers.get('If-Modified-Since') == mock_server.last_modified
+
+        def log_message(self, format, *args):
+            pass
+
+    return RequestHandler
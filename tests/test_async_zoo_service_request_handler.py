@@ -0,0 +1,142 @@
+import asyncio
+import json
+import unittest
+
+import tests.create_test_data as test_data
+
+from tests.mock_requests import MockRequests
+from tests.mock_zoo_server import MockZooServer
+
+from zoo_keeper_server.async_zoo_service_request_handler import AsyncZooServiceRequestHandler
+from zoo_keeper_server.db_request_handler import get_zoo_keeper_jsons_async
+from zoo_keeper_server.zoo_keeper import ZooKeeper
+from zoo_keeper_server.zoo_service_request_handler import NoResponse, BadResponse
+
+
+class TestAsyncZooServiceRequestHandler(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockZooServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset()
+        self.loop = asyncio.new_event_loop()
+        self.handler = AsyncZooServiceRequestHandler(self.server.url)
+
+    def tearDown(self):
+        self.run_coroutine(self.handler.close())
+        self.loop.close()
+
+    def run_coroutine(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_defaults(self):
+        self.assertEqual(self.handler.timeout, 2)
+        self.assertEqual(self.handler.request_attempts, 3)
+        self.assertEqual(self.handler.monkey_addr, self.server.url + '/monkeys/')
+        self.assertEqual(self.handler.zoo_addr, self.server.url + '/zoos/')
+
+    def test_get_all_monkeys(self):
+        self.assertEqual(self.run_coroutine(self.handler.get_all_monkeys()), MockRequests.all_monkey_jsons())
+
+    def test_get_all_zoos(self):
+        self.assertEqual(self.run_coroutine(self.handler.get_all_zoos()), MockRequests.all_zoo_jsons())
+
+    def test_get_zoo(self):
+        self.assertEqual(self.run_coroutine(self.handler.get_zoo(1)), MockRequests.zoo_json(1))
+
+    def test_get_monkey(self):
+        self.assertEqual(self.run_coroutine(self.handler.get_monkey(3)), {'id': 3, 'zoo_id': 2})
+
+    def test_get_bad_id(self):
+        for coroutine in (self.handler.get_zoo(10), self.handler.get_monkey(10)):
+            with self.assertRaises(BadResponse) as cm:
+                self.run_coroutine(coroutine)
+            error_json = json.loads(cm.exception.args[0])
+            self.assertEqual(error_json, MockRequests.not_found_json(10))
+
+    def test_has_zoo_and_monkey(self):
+        self.assertTrue(self.run_coroutine(self.handler.has_zoo(1)))
+        self.assertFalse(self.run_coroutine(self.handler.has_zoo(10)))
+        self.assertTrue(self.run_coroutine(self.handler.has_monkey(1)))
+        self.assertFalse(self.run_coroutine(self.handler.has_monkey(10)))
+        self.assertEqual([method for method, _ in self.server.requests], ['HEAD'] * 4)
+
+    def test_is_monkey_in_zoo(self):
+        self.assertTrue(self.run_coroutine(self.handler.is_monkey_in_zoo(1, 1)))
+        self.assertFalse(self.run_coroutine(self.handler.is_monkey_in_zoo(1, 2)))
+        with self.assertRaises(BadResponse):
+            self.run_coroutine(self.handler.is_monkey_in_zoo(10, 1))
+
+    def test_timeout(self):
+        self.server.delay = 0.2
+        handler = AsyncZooServiceRequestHandler(self.server.url, timeout=0.05, request_attempts=2)
+        try:
+            with self.assertRaises(NoResponse) as cm:
+                self.run_coroutine(handler.get_zoo(1))
+        finally:
+            self.run_coroutine(handler.close())
+        expected = {
+            'error': 504,
+            'title': 'gateway timeout',
+            'error_type': 'NoResponse',
+            'text': 'at address: {}/zoos/1, attempts: 2, timeout after: 0.05 seconds'.format(self.server.url)
+        }
+        self.assertEqual(json.loads(cm.exception.args[0]), expected)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_no_connection(self):
+        closed_server = MockZooServer()
+        closed_server.stop()
+        handler = AsyncZooServiceRequestHandler(closed_server.url)
+        try:
+            with self.assertRaises(NoResponse) as cm:
+                self.run_coroutine(handler.get_zoo(1))
+        finally:
+            self.run_coroutine(handler.close())
+        error_json = json.loads(cm.exception.args[0])
+        self.assertEqual(error_json['error'], 504)
+        self.assertEqual(error_json['error_type'], 'NoResponse')
+
+    def test_reuses_connections(self):
+        for _ in range(3):
+            self.run_coroutine(self.handler.get_zoo(1))
+        connector = self.handler.session.connector
+        self.assertEqual(sum(len(connections) for connections in connector._conns.values()), 1)
+
+    def test_get_zoo_service_jsons_gathers_lookups(self):
+        self.server.delay = 0.2
+        lookups = [('zoo', 1), ('zoo', 10), ('monkey', 1), ('monkey', 2), ('monkey', 3)]
+        start = self.loop.time()
+        response = self.run_coroutine(self.handler.get_zoo_service_jsons(lookups))
+        self.assertLess(self.loop.time() - start, 0.2 * len(lookups))
+
+        expected = {
+            ('zoo', 1): MockRequests.zoo_json(1),
+            ('zoo', 10): MockRequests.not_found_json(10),
+            ('monkey', 1): MockRequests.monkey_json(1),
+            ('monkey', 2): MockRequests.monkey_json(2),
+            ('monkey', 3): MockRequests.monkey_json(3),
+        }
+        self.assertEqual(response, expected)
+
+    def test_get_zoo_keeper_jsons_async(self):
+        session = test_data.TestSession()
+        try:
+            test_data.create_all_test_data(session)
+            zoo_keepers = session.query(ZooKeeper).all()
+            response = self.run_coroutine(get_zoo_keeper_jsons_async(zoo_keepers, self.handler))
+        finally:
+            session.close()
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual(response[0]['zoo'], MockRequests.zoo_json(1))
+        self.assertEqual(response[0]['favorite_monkey'], MockRequests.monkey_json(1))
+        self.assertEqual(response[0]['dream_monkey'], MockRequests.monkey_json(3))
+        self.assertEqual(response[1]['dream_monkey'], {})
+        self.assertEqual(response[3]['zoo'], {})
+        self.assertEqual([keeper['name'] for keeper in response], ['a', 'b', 'c', 'd'])
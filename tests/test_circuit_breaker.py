@@ -0,0 +1,125 @@
+import unittest
+from unittest.mock import patch
+
+from zoo_keeper_server.circuit_breaker import CircuitBreaker, CircuitBreakers, CLOSED, OPEN, HALF_OPEN
+
+MONOTONIC_PATCH = 'zoo_keeper_server.circuit_breaker.time.monotonic'
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, half_open_max_calls=1)
+
+    def test_defaults(self):
+        breaker = CircuitBreaker()
+        self.assertEqual(breaker.failure_threshold, 5)
+        self.assertEqual(breaker.reset_timeout, 30)
+        self.assertEqual(breaker.half_open_max_calls, 1)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.breaker.rejected, 1)
+
+    def test_success_resets_failure_count(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.breaker.record_success()
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    @patch(MONOTONIC_PATCH)
+    def test_half_open_after_reset_timeout(self, mock_time):
+        mock_time.return_value = 100.
+        for _ in range(3):
+            self.breaker.record_failure()
+
+        mock_time.return_value = 109.
+        self.assertEqual(self.breaker.state, OPEN)
+
+        mock_time.return_value = 110.
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+    @patch(MONOTONIC_PATCH)
+    def test_half_open_success_closes(self, mock_time):
+        mock_time.return_value = 100.
+        for _ in range(3):
+            self.breaker.record_failure()
+        mock_time.return_value = 110.
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+    @patch(MONOTONIC_PATCH)
+    def test_half_open_failure_reopens(self, mock_time):
+        mock_time.return_value = 100.
+        for _ in range(3):
+            self.breaker.record_failure()
+        mock_time.return_value = 110.
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+
+        mock_time.return_value = 119.
+        self.assertFalse(self.breaker.allow_request())
+        mock_time.return_value = 120.
+        self.assertTrue(self.breaker.allow_request())
+
+    @patch(MONOTONIC_PATCH)
+    def test_half_open_release_gives_back_the_trial(self, mock_time):
+        mock_time.return_value = 100.
+        for _ in range(3):
+            self.breaker.record_failure()
+        mock_time.return_value = 110.
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.release()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+    @patch(MONOTONIC_PATCH)
+    def test_stats_count_state_changes(self, mock_time):
+        mock_time.return_value = 100.
+        for _ in range(4):
+            self.breaker.record_failure()
+        self.breaker.allow_request()
+        mock_time.return_value = 110.
+        self.breaker.allow_request()
+        self.breaker.record_success()
+
+        expected = {'state': CLOSED, 'rejected': 1, CLOSED: 1, OPEN: 1, HALF_OPEN: 1}
+        self.assertEqual(self.breaker.stats(), expected)
+
+
+class TestCircuitBreakers(unittest.TestCase):
+
+    def test_one_breaker_per_family(self):
+        breakers = CircuitBreakers(failure_threshold=1)
+        zoos = breakers.get('zoos')
+        self.assertIs(zoos, breakers.get('zoos'))
+        self.assertIsNot(zoos, breakers.get('monkeys'))
+
+        zoos.record_failure()
+        self.assertEqual(breakers.get('zoos').state, OPEN)
+        self.assertEqual(breakers.get('monkeys').state, CLOSED)
+        self.assertEqual(set(breakers.stats()), {'zoos', 'monkeys'})
+
+    def test_configure(self):
+        breakers = CircuitBreakers()
+        old = breakers.get('zoos')
+        breakers.configure(failure_threshold=2, reset_timeout=3, half_open_max_calls=4)
+        new = breakers.get('zoos')
+        self.assertIsNot(old, new)
+        self.assertEqual((new.failure_threshold, new.reset_timeout, new.half_open_max_calls), (2, 3, 4))
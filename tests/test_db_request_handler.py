@@ -1,19 +1,26 @@
 import json
+import threading
+import time
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, call
 
 import requests
+from sqlalchemy.exc import IntegrityError
 
 import tests.create_test_data as test_data
 
-from zoo_keeper_server.db_request_handler import DBRequestHandler, BadId, BadData
+from zoo_keeper_server.db_request_handler import DBRequestHandler, BadId, BadData, StaleVersion
+from zoo_keeper_server.deadline import Deadline, DeadlineExceeded
+from zoo_keeper_server.enrichment_executor import SharedExecutor
+from zoo_keeper_server.lookup_cache import LookupCache
+from zoo_keeper_server.zoo_keeper import ZooKeeper
 from zoo_keeper_server.zoo_service_request_handler import NoResponse
 from zoo_keeper_server.zoo_service_request_handler import ZooServiceRequestHandler
 
 from tests.mock_requests import MockRequests, MockResponse
 
-REQUESTS_GET_PATCH = 'requests.get'
-REQUESTS_HEAD_PATCH = 'requests.head'
+REQUESTS_GET_PATCH = 'requests.Session.get'
+REQUESTS_HEAD_PATCH = 'requests.Session.head'
 
 
 class TestDBRequestHandler(unittest.TestCase):
@@ -233,6 +240,169 @@ class TestDBRequestHandler(unittest.TestCase):
         to_post = {'name': 'd'}
         self.assertRaises(BadData, self.handler.post_zoo_keeper, self.session, to_post)
 
+    def test_post_zoo_keepers(self):
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), insert_batch_size=2)
+        to_post = [
+            {'name': 'e', 'age': 50},
+            {'name': 'a', 'age': 10},
+            {'name': 'f', 'age': 60, 'zoo_id': 1},
+            {'name': 'e', 'age': 70},
+            {'name': 'g'},
+            'oops',
+            {'name': 'h', 'age': 80, 'dream_monkey_id': 'null'},
+        ]
+        response = handler.post_zoo_keepers(self.session, to_post)
+        response_json = json.loads(response[0])
+        self.assertEqual(response[1], 200)
+        self.assertEqual(response_json['created'], 3)
+        self.assertEqual(response_json['failed'], 4)
+
+        results = response_json['results']
+        self.assertEqual([result['index'] for result in results], list(range(7)))
+        self.assertEqual([result['status'] for result in results], [201, 400, 201, 400, 400, 400, 201])
+        self.assertEqual(results[1]['error'], 'name: "a" already exists')
+        self.assertEqual(results[3]['error'], 'name: "e" is repeated in this request')
+
+        for index in (0, 2, 6):
+            zoo_keeper_json = results[index]['zoo_keeper']
+            self.assertNotIn('zoo', zoo_keeper_json)
+            get_response = json.loads(self.handler.get_zoo_keeper(self.session, zoo_keeper_json['id'])[0])
+            self.assertEqual({key: get_response[key] for key in zoo_keeper_json}, zoo_keeper_json)
+        self.assertEqual(results[2]['zoo_keeper']['zoo_id'], 1)
+        self.assertEqual(test_data.TestSession.commit_counts(), 1)
+
+    def test_post_zoo_keepers_names_compare_like_the_db(self):
+        to_post = [{'name': 'E', 'age': 50}, {'name': 'e ', 'age': 60}, {'name': 'g', 'age': 70}]
+        get_by_name = self.handler._get_zoo_keepers_by_name
+
+        def get_by_name_ignoring_case(session, names, action):
+            if action == 'check zoo keeper names':
+                return [ZooKeeper('A ', 10)]
+            return get_by_name(session, names, action)
+
+        with patch.object(self.handler, '_get_zoo_keepers_by_name', get_by_name_ignoring_case):
+            response = self.handler.post_zoo_keepers(self.session, to_post + [{'name': 'a', 'age': 80}])
+        results = json.loads(response[0])['results']
+        self.assertEqual([result['status'] for result in results], [201, 400, 201, 400])
+        self.assertEqual(results[1]['error'], 'name: "e " is repeated in this request')
+        self.assertEqual(results[3]['error'], 'name: "A " already exists')
+
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_post_zoo_keepers_enrich(self):
+        to_post = [{'name': 'e', 'age': 50, 'zoo_id': 1, 'favorite_monkey_id': 1, 'dream_monkey_id': 3}]
+        response_json = json.loads(self.handler.post_zoo_keepers(self.session, to_post, enrich=True)[0])
+        zoo_keeper_json = response_json['results'][0]['zoo_keeper']
+        get_response = self.handler.get_zoo_keeper(self.session, zoo_keeper_json['id'])
+        self.assertEqual(zoo_keeper_json, json.loads(get_response[0]))
+
+    def test_post_zoo_keepers_bad_values_fail_their_row(self):
+        to_post = [
+            {'name': 'e', 'age': 50},
+            {'name': 'null', 'age': 60},
+            {'name': 'x' * 21, 'age': 60},
+            {'name': '', 'age': 60},
+            {'name': 'f', 'age': 'old'},
+            {'name': 'g', 'age': 'null'},
+            {'name': 'h', 'age': 60, 'zoo_id': 1.5},
+            {'name': 'i', 'age': 60, 'zoo_id': 'null'},
+        ]
+        response_json = json.loads(self.handler.post_zoo_keepers(self.session, to_post)[0])
+        self.assertEqual((response_json['created'], response_json['failed']), (2, 6))
+        statuses = [result['status'] for result in response_json['results']]
+        self.assertEqual(statuses, [201, 400, 400, 400, 400, 400, 400, 201])
+        self.assertEqual(response_json['results'][4]['error'], 'age must be an integer: old')
+
+    def test_post_zoo_keepers_insert_failure_inserts_nothing(self):
+        all_zoo_keepers = self.handler.get_all_zoo_keepers(self.session)[0]
+        to_post = [{'name': 'e', 'age': 50}, {'name': 'f', 'age': 60}]
+        error = IntegrityError('INSERT', {}, Exception('duplicate'))
+        with patch.object(self.session, 'execute', side_effect=error):
+            self.assertRaises(BadData, self.handler.post_zoo_keepers, self.session, to_post)
+        self.assertEqual(self.handler.get_all_zoo_keepers(self.session)[0], all_zoo_keepers)
+
+    def test_patch_zoo_keepers_by_ids(self):
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), insert_batch_size=2)
+        response = handler.patch_zoo_keepers(self.session, {'ids': [1, '3', 4, 100], 'set': {'zoo_id': 'null'}})
+        self.assertEqual(json.loads(response[0]), {'updated': 3, 'ids': [1, 3, 4], 'missing': [100]})
+        self.assertEqual(response[1], 200)
+        self.assertEqual(test_data.TestSession.commit_counts(), 1)
+
+        self.session.expire_all()
+        zoo_ids = {zoo_keeper.id: zoo_keeper.zoo_id for zoo_keeper in self.session.query(ZooKeeper)}
+        self.assertEqual(zoo_ids, {1: None, 2: 2, 3: None, 4: None})
+
+    def test_patch_zoo_keepers_by_filter(self):
+        to_patch = {'filter': {'zoo_id': 2}, 'set': {'zoo_id': 1, 'favorite_monkey_id': None}}
+        response = self.handler.patch_zoo_keepers(self.session, to_patch)
+        self.assertEqual(json.loads(response[0]), {'updated': 2, 'ids': [2, 3]})
+
+        response = self.handler.patch_zoo_keepers(self.session, {'filter': {'zoo_id': None}, 'set': {'age': 1}})
+        self.assertEqual(json.loads(response[0]), {'updated': 1, 'ids': [4]})
+
+        self.session.expire_all()
+        zoo_keeper = self.session.query(ZooKeeper).filter(ZooKeeper.id == 3).one()
+        self.assertEqual((zoo_keeper.zoo_id, zoo_keeper.favorite_monkey_id), (1, None))
+
+    def test_patch_zoo_keepers_bad_data(self):
+        bad_patches = [
+            {'ids': [1]},
+            {'ids': [1], 'set': {}},
+            {'ids': [1], 'set': {'oops': 1}},
+            {'set': {'age': 1}},
+            {'ids': [1], 'filter': {'age': 1}, 'set': {'age': 1}},
+            {'ids': ['x'], 'set': {'age': 1}},
+            {'ids': 1, 'set': {'age': 1}},
+            {'ids': '12', 'set': {'age': 1}},
+            {'ids': [1.9], 'set': {'age': 1}},
+            {'ids': [True], 'set': {'age': 1}},
+            {'ids': ['-1'], 'set': {'age': 1}},
+            {'filter': {}, 'set': {'age': 1}},
+            {'filter': {'oops': 1}, 'set': {'age': 1}},
+            {'ids': [1, 2], 'set': {'name': 'same'}},
+            {'ids': [1], 'set': {'age': 'old'}},
+            {'ids': [1], 'set': {'age': 'null'}},
+            {'ids': [1], 'set': {'name': 'x' * 21}},
+            {'ids': [1], 'set': {'name': 'null'}},
+            {'ids': [1], 'set': {'zoo_id': 1.5}},
+        ]
+        for to_patch in bad_patches:
+            self.assertRaises(BadData, self.handler.patch_zoo_keepers, self.session, to_patch)
+        for ids in ('12', [1.9], [True]):
+            self.assertRaises(BadData, self.handler.delete_zoo_keepers, self.session, {'ids': ids})
+        self.session.expire_all()
+        self.assertEqual(self.session.query(ZooKeeper).filter(ZooKeeper.name == 'same').count(), 0)
+
+    def test_delete_zoo_keepers(self):
+        response = self.handler.delete_zoo_keepers(self.session, {'ids': [1, 100]})
+        self.assertEqual(json.loads(response[0]), {'deleted': 1, 'ids': [1], 'missing': [100]})
+
+        response = self.handler.delete_zoo_keepers(self.session, {'filter': {'zoo_id': 2}})
+        self.assertEqual(json.loads(response[0]), {'deleted': 2, 'ids': [2, 3]})
+        self.assertEqual(test_data.TestSession.commit_counts(), 2)
+
+        self.session.expire_all()
+        self.assertEqual([zoo_keeper.id for zoo_keeper in self.session.query(ZooKeeper)], [4])
+        self.assertRaises(BadData, self.handler.delete_zoo_keepers, self.session, {'filter': {}})
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_return_minimal_skips_enrichment(self, mock_get):
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), return_minimal=True)
+
+        response = handler.post_zoo_keeper(self.session, {'name': 'e', 'age': 50, 'zoo_id': 1})
+        response_json = json.loads(response[0])
+        expected = {'id': response_json['id'], 'name': 'e', 'age': 50, 'zoo_id': 1,
+                    'favorite_monkey_id': None, 'dream_monkey_id': None}
+        self.assertEqual(response_json, expected)
+        self.assertEqual(response[1:], (201, {'Location': '/zoo_keepers/{}'.format(expected['id'])}))
+
+        response = handler.put_zoo_keeper(self.session, expected['id'], {'age': 51})
+        self.assertEqual(response, ('', 204, {'Location': '/zoo_keepers/{}'.format(expected['id'])}))
+
+        self.assertEqual(handler.delete_zoo_keeper(self.session, expected['id']), ('', 204))
+        self.assertRaises(BadId, handler.get_zoo_keeper, self.session, expected['id'])
+        self.assertEqual(test_data.TestSession.commit_counts(), 3)
+        mock_get.assert_not_called()
+
     @patch(REQUESTS_GET_PATCH, MockRequests.get)
     def test_put_zoo_keeper_all_fields(self):
         to_put_id = 4
@@ -365,3 +535,500 @@ class TestDBRequestHandler(unittest.TestCase):
         }
         self.assertEqual(response_json, expected)
         self.assertEqual(response[1], 200)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_zoo_service_lookups_run_concurrently(self, mock_get):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def get_after_barrier(addr, timeout=1):
+            barrier.wait()
+            return MockRequests.get(addr, timeout)
+
+        mock_get.side_effect = get_after_barrier
+        response = self.handler.get_zoo_keeper(self.session, 1)
+        expected = {
+            'id': 1,
+            'age': 10,
+            'dream_monkey': {'id': 3, 'zoo_id': 2},
+            'dream_monkey_id': 3,
+            'favorite_monkey': {'id': 1, 'zoo_id': 1},
+            'favorite_monkey_id': 1,
+            'name': 'a',
+            'zoo': {'id': 1, 'monkeys': [{'id': 1, 'zoo_id': 1}, {'id': 2, 'zoo_id': 1}]},
+            'zoo_id': 1
+        }
+        self.assertEqual(json.loads(response[0]), expected)
+
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_get_all_zoo_keepers_max_workers_does_not_change_response(self):
+        expected = self.handler.get_all_zoo_keepers(self.session)
+        for max_workers in (1, 2, 20):
+            executor = SharedExecutor(max_workers=max_workers)
+            handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), executor=executor)
+            self.assertEqual(handler.get_all_zoo_keepers(self.session), expected)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_max_workers_caps_concurrent_lookups(self, mock_get):
+        lock = threading.Lock()
+        counts = {'running': 0, 'max': 0}
+
+        def counting_get(addr, timeout=1):
+            with lock:
+                counts['running'] += 1
+                counts['max'] = max(counts['max'], counts['running'])
+            threading.Event().wait(0.01)
+            with lock:
+                counts['running'] -= 1
+            return MockRequests.get(addr, timeout)
+
+        mock_get.side_effect = counting_get
+        executor = SharedExecutor(max_workers=2)
+        handlers = [
+            DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), executor=executor) for _ in range(3)
+        ]
+        threads = [
+            threading.Thread(target=handler._get_zoo_service_jsons, args=(self.session.query(ZooKeeper).all(),))
+            for handler in handlers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(mock_get.call_count, 12)
+        self.assertEqual(counts['max'], 2)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_get_all_zoo_keepers_fetches_each_zoo_service_id_once(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        self.handler.post_zoo_keeper(
+            self.session, {'name': 'e', 'age': 50, 'zoo_id': 1, 'favorite_monkey_id': 1, 'dream_monkey_id': 3}
+        )
+        mock_get.reset_mock()
+
+        response = self.handler.get_all_zoo_keepers(self.session)
+        response_json = json.loads(response[0])
+        self.assertEqual(len(response_json), 5)
+        self.assertEqual(response_json[0]['zoo'], response_json[4]['zoo'])
+
+        expected_calls = [
+            call('http://localhost:8080/zoos/1', timeout=2),
+            call('http://localhost:8080/monkeys/3', timeout=2),
+            call('http://localhost:8080/monkeys/1', timeout=2),
+            call('http://localhost:8080/zoos/2', timeout=2),
+        ]
+        self.assertCountEqual(mock_get.call_args_list, expected_calls)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_get_all_zoo_keepers_bulk_threshold_uses_catalogs(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        expected = self.handler.get_all_zoo_keepers(self.session)
+        mock_get.reset_mock()
+
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), bulk_threshold=4)
+        self.assertEqual(handler.get_all_zoo_keepers(self.session), expected)
+        expected_calls = [
+            call('http://localhost:8080/zoos/', timeout=2),
+            call('http://localhost:8080/monkeys/', timeout=2),
+        ]
+        self.assertCountEqual(mock_get.call_args_list, expected_calls)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_get_all_zoo_keepers_bulk_threshold_counts_cache_misses(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        expected = self.handler.get_all_zoo_keepers(self.session)
+        cache = LookupCache()
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080", cache=cache), bulk_threshold=2)
+        for zoo_id in (1, 2):
+            handler.zoo_service_rh.get_zoo(zoo_id)
+        mock_get.reset_mock()
+
+        self.assertEqual(handler.get_all_zoo_keepers(self.session), expected)
+        self.assertEqual(mock_get.call_args_list, [call('http://localhost:8080/monkeys/', timeout=2)])
+
+        mock_get.reset_mock()
+        self.assertEqual(handler.get_all_zoo_keepers(self.session), expected)
+        mock_get.assert_not_called()
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_get_all_zoo_keepers_below_bulk_threshold_does_not_use_catalogs(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), bulk_threshold=5)
+        handler.get_all_zoo_keepers(self.session)
+        self.assertNotIn(call('http://localhost:8080/zoos/', timeout=2), mock_get.call_args_list)
+        self.assertEqual(mock_get.call_count, 4)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_get_all_zoo_keepers_bulk_missing_id_falls_back_to_single_fetch(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        self.handler.post_zoo_keeper(self.session, {'name': 'e', 'age': 50, 'zoo_id': 100})
+        expected = self.handler.get_all_zoo_keepers(self.session)
+        mock_get.reset_mock()
+
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), bulk_threshold=1)
+        response = handler.get_all_zoo_keepers(self.session)
+        self.assertEqual(response, expected)
+        self.assertEqual(json.loads(response[0])[4]['zoo']['error'], 404)
+        expected_calls = [
+            call('http://localhost:8080/zoos/', timeout=2),
+            call('http://localhost:8080/monkeys/', timeout=2),
+            call('http://localhost:8080/zoos/100', timeout=2),
+        ]
+        self.assertCountEqual(mock_get.call_args_list, expected_calls)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_get_all_zoo_keepers_bulk_failure_falls_back_to_single_fetch(self, mock_get):
+        def get_without_catalogs(addr, timeout=1):
+            if addr.endswith('/'):
+                raise requests.exceptions.Timeout()
+            return MockRequests.get(addr, timeout)
+
+        mock_get.side_effect = MockRequests.get
+        expected = self.handler.get_all_zoo_keepers(self.session)
+
+        mock_get.side_effect = get_without_catalogs
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), bulk_threshold=1)
+        self.assertEqual(handler.get_all_zoo_keepers(self.session), expected)
+
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_expired_deadline_stops_db_queries(self):
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), deadline=Deadline(0))
+        self.assertRaises(DeadlineExceeded, handler.get_zoo_keeper, self.session, 1)
+        self.assertRaises(DeadlineExceeded, handler.get_all_zoo_keepers, self.session)
+        self.assertRaises(DeadlineExceeded, handler.post_zoo_keeper, self.session, {'name': 'e', 'age': 50})
+        self.assertRaises(DeadlineExceeded, handler.put_zoo_keeper, self.session, 1, {'age': 50})
+        self.assertRaises(DeadlineExceeded, handler.delete_zoo_keeper, self.session, 1)
+        self.assertEqual(test_data.TestSession.commit_counts(), 0)
+
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_deadline_passing_during_commit_does_not_fail_the_write(self):
+        deadline = Deadline(5)
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), deadline=deadline)
+        commit = self.session.commit
+
+        def slow_commit():
+            commit()
+            deadline.expires_at = 0.
+
+        with patch.object(self.session, 'commit', slow_commit):
+            response = handler.put_zoo_keeper(self.session, 1, {'age': 77})
+        self.assertEqual(response[1], 200)
+        self.assertEqual(json.loads(response[0])['age'], 77)
+        self.assertEqual(self.session.query(ZooKeeper).get(1).age, 77)
+
+    def test_deadline_limits_query_execution_time(self):
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), deadline=Deadline(5))
+        query = str(handler._query(self.session, 'test'))
+        self.assertRegex(query, r'^SELECT /\*\+ MAX_EXECUTION_TIME\(\d+\) \*/ ')
+
+        query = str(self.handler._query(self.session, 'test'))
+        self.assertNotIn('MAX_EXECUTION_TIME', query)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_deadline_returns_unfinished_lookups_as_errors(self, mock_get):
+        release = threading.Event()
+
+        def slow_monkeys(addr, timeout=1):
+            if '/monkeys/' in addr:
+                release.wait(5)
+            return MockRequests.get(addr, timeout)
+
+        mock_get.side_effect = slow_monkeys
+        deadline = Deadline(0.2)
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080", deadline=deadline),
+                                   deadline=deadline)
+        try:
+            response = handler.get_zoo_keeper(self.session, 2)
+        finally:
+            release.set()
+
+        expected = {
+            'id': 2,
+            'age': 20,
+            'dream_monkey': {},
+            'dream_monkey_id': None,
+            'favorite_monkey': {
+                'error': 504,
+                'error_type': 'NoResponse',
+                'text': 'at address: http://localhost:8080/monkeys/3, deadline of 0.2 seconds exceeded',
+                'title': 'gateway timeout'
+            },
+            'favorite_monkey_id': 3,
+            'name': 'b',
+            'zoo': {'id': 2, 'monkeys': [{'id': 3, 'zoo_id': 2}, {'id': 4, 'zoo_id': 2}]},
+            'zoo_id': 2
+        }
+        self.assertEqual(json.loads(response[0]), expected)
+
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_get_all_zoo_keepers_pages(self):
+        all_jsons = json.loads(self.handler.get_all_zoo_keepers(self.session)[0])
+
+        first_page = self.handler.get_all_zoo_keepers(self.session, limit=3)
+        self.assertEqual(json.loads(first_page[0]), all_jsons[:3])
+        self.assertEqual(first_page[1], 200)
+        self.assertEqual(first_page[2]['Link'], '<?after=3&limit=3>; rel="next"')
+
+        second_page = self.handler.get_all_zoo_keepers(self.session, after='3', limit='3')
+        self.assertEqual(json.loads(second_page[0]), all_jsons[3:])
+        self.assertNotIn('Link', second_page[2])
+
+        exact_page = self.handler.get_all_zoo_keepers(self.session, after=0, limit=4)
+        self.assertEqual(json.loads(exact_page[0]), all_jsons)
+        self.assertNotIn('Link', exact_page[2])
+
+        empty_page = self.handler.get_all_zoo_keepers(self.session, after=100)
+        self.assertEqual(json.loads(empty_page[0]), [])
+
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_get_all_zoo_keepers_page_sizes(self):
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), page_size=2, max_page_size=3)
+
+        response = handler.get_all_zoo_keepers(self.session)
+        self.assertEqual([keeper['id'] for keeper in json.loads(response[0])], [1, 2])
+        self.assertEqual(response[2]['Link'], '<?after=2&limit=2>; rel="next"')
+
+        response = handler.get_all_zoo_keepers(self.session, limit=10)
+        self.assertEqual([keeper['id'] for keeper in json.loads(response[0])], [1, 2, 3])
+        self.assertEqual(response[2]['Link'], '<?after=3&limit=3>; rel="next"')
+
+    def test_get_all_zoo_keepers_bad_page_args(self):
+        self.assertRaises(BadData, self.handler.get_all_zoo_keepers, self.session, after='x')
+        self.assertRaises(BadData, self.handler.get_all_zoo_keepers, self.session, limit='x')
+        self.assertRaises(BadData, self.handler.get_all_zoo_keepers, self.session, limit=0)
+
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_stream_zoo_keepers(self):
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), stream_chunk_size=3)
+        all_zoo_keepers = self.handler.get_all_zoo_keepers(self.session, limit=100)[0]
+
+        chunks = list(handler.stream_zoo_keepers(self.session))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(''.join(chunks), all_zoo_keepers)
+
+        lines = ''.join(handler.stream_zoo_keepers(self.session, ndjson=True)).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], json.loads(all_zoo_keepers))
+
+        after_chunks = ''.join(handler.stream_zoo_keepers(self.session, after='3'))
+        self.assertEqual(json.loads(after_chunks), json.loads(all_zoo_keepers)[3:])
+
+        self.assertEqual(''.join(handler.stream_zoo_keepers(self.session, after=100)), '[]')
+        self.assertEqual(list(handler.stream_zoo_keepers(self.session, ndjson=True, after=100)), [''])
+        self.assertRaises(BadData, next, handler.stream_zoo_keepers(self.session, after='x'))
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_stream_zoo_keepers_deadline_per_chunk(self, mock_get):
+        def slow_get(addr, timeout=1):
+            time.sleep(0.1)
+            return MockRequests.get(addr, timeout)
+
+        mock_get.side_effect = slow_get
+        deadline = Deadline(0.3)
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080", deadline=deadline),
+                                   deadline=deadline, stream_chunk_size=1)
+        lines = ''.join(handler.stream_zoo_keepers(self.session, ndjson=True)).splitlines()
+
+        self.assertGreater(len(lines), 3)
+        self.assertNotIn('"error"', ''.join(lines))
+        query = str(handler._query(self.session, 'test', limit_execution_time=False))
+        self.assertNotIn('MAX_EXECUTION_TIME', query)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_fields_select_columns_without_zoo_service_calls(self, mock_get):
+        response = self.handler.get_all_zoo_keepers(self.session, fields='id,name,zoo_id')
+        expected = [
+            {'id': 1, 'name': 'a', 'zoo_id': 1},
+            {'id': 2, 'name': 'b', 'zoo_id': 2},
+            {'id': 3, 'name': 'c', 'zoo_id': 2},
+            {'id': 4, 'name': 'd', 'zoo_id': None},
+        ]
+        self.assertEqual(json.loads(response[0]), expected)
+
+        response = self.handler.get_zoo_keeper(self.session, 1, fields='name', expand='')
+        self.assertEqual(json.loads(response[0]), {'id': 1, 'name': 'a'})
+
+        response = self.handler.get_zoo_keeper(self.session, 1, expand='')
+        self.assertEqual(set(json.loads(response[0])), {'id', 'name', 'age', 'zoo_id', 'favorite_monkey_id',
+                                                        'dream_monkey_id'})
+        mock_get.assert_not_called()
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_expand_fetches_only_requested_relations(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        response = self.handler.get_zoo_keeper(self.session, 1, fields='id,zoo', expand='dream_monkey')
+        expected = {
+            'id': 1,
+            'zoo': {'id': 1, 'monkeys': [{'id': 1, 'zoo_id': 1}, {'id': 2, 'zoo_id': 1}]},
+            'dream_monkey': {'id': 3, 'zoo_id': 2},
+        }
+        self.assertEqual(json.loads(response[0]), expected)
+        self.assertEqual(
+            sorted(call_args[0][0] for call_args in mock_get.call_args_list),
+            ['http://localhost:8080/monkeys/3', 'http://localhost:8080/zoos/1']
+        )
+
+        mock_get.reset_mock()
+        response = self.handler.get_all_zoo_keepers(self.session, expand='zoo')
+        zoo_keeper_json = json.loads(response[0])[0]
+        self.assertEqual(zoo_keeper_json['favorite_monkey_id'], 1)
+        self.assertNotIn('favorite_monkey', zoo_keeper_json)
+        self.assertTrue(all('/zoos/' in call_args[0][0] for call_args in mock_get.call_args_list))
+
+    def test_bad_fields_and_expand(self):
+        self.assertRaises(BadData, self.handler.get_all_zoo_keepers, self.session, fields='id,oops')
+        self.assertRaises(BadData, self.handler.get_zoo_keeper, self.session, 1, expand='name')
+
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_get_all_zoo_keepers_filters(self):
+        def get_ids(**filters):
+            response = self.handler.get_all_zoo_keepers(self.session, fields='id', filters=filters)
+            return [zoo_keeper_json['id'] for zoo_keeper_json in json.loads(response[0])]
+
+        self.assertEqual(get_ids(zoo_id='2'), [2, 3])
+        self.assertEqual(get_ids(zoo_id='null'), [4])
+        self.assertEqual(get_ids(favorite_monkey_id=3), [2])
+        self.assertEqual(get_ids(dream_monkey_id=3), [1])
+        self.assertEqual(get_ids(min_age='20', max_age='30'), [2, 3])
+        self.assertEqual(get_ids(zoo_id=2, min_age=25), [3])
+        self.assertEqual(get_ids(name_prefix='c'), [3])
+        self.assertEqual(get_ids(name_prefix='%'), [])
+
+        self.assertRaises(BadData, get_ids, oops=1)
+        self.assertRaises(BadData, get_ids, zoo_id='x')
+        self.assertRaises(BadData, get_ids, min_age='null')
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_get_all_zoo_keepers_filters_before_enrichment(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        response = self.handler.get_all_zoo_keepers(self.session, limit=1, filters={'zoo_id': 'null'})
+        self.assertEqual([zoo_keeper_json['id'] for zoo_keeper_json in json.loads(response[0])], [4])
+        mock_get.assert_not_called()
+
+        response = self.handler.get_all_zoo_keepers(self.session, limit=1, fields='id', filters={'zoo_id': 2})
+        self.assertEqual(response[2]['Link'], '<?after=2&limit=1&fields=id&zoo_id=2>; rel="next"')
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_get_zoo_keepers_by_ids(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        response = self.handler.get_zoo_keepers_by_ids(self.session, '3, 100,2,3')
+        response_json = json.loads(response[0])
+        self.assertEqual(response[1], 200)
+        self.assertEqual(response_json['missing'], [100])
+
+        expected = [json.loads(self.handler.get_zoo_keeper(self.session, zoo_keeper_id)[0]) for zoo_keeper_id in (3, 2)]
+        self.assertEqual(response_json['zoo_keepers'], expected)
+
+        mock_get.reset_mock()
+        self.handler.get_zoo_keepers_by_ids(self.session, '2,3')
+        requested = sorted(call_args[0][0] for call_args in mock_get.call_args_list)
+        self.assertEqual(requested, ['http://localhost:8080/monkeys/3', 'http://localhost:8080/zoos/2'])
+
+        response = self.handler.get_zoo_keepers_by_ids(self.session, '1', fields='name')
+        self.assertEqual(json.loads(response[0]), {'zoo_keepers': [{'id': 1, 'name': 'a'}], 'missing': []})
+
+    def test_get_zoo_keepers_by_ids_bad_ids(self):
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), max_page_size=2)
+        self.assertRaises(BadData, handler.get_zoo_keepers_by_ids, self.session, '1,x')
+        self.assertRaises(BadData, handler.get_zoo_keepers_by_ids, self.session, '1,2,3')
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_response_cache(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        cache = LookupCache()
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), response_cache=cache)
+
+        expected = self.handler.get_zoo_keeper(self.session, 1)
+        mock_get.reset_mock()
+        self.assertEqual(handler.get_zoo_keeper(self.session, 1), expected)
+        self.assertEqual(handler.get_zoo_keeper(self.session, 1), expected)
+        self.assertEqual(mock_get.call_count, 3)
+
+        mock_get.reset_mock()
+        all_zoo_keepers = handler.get_all_zoo_keepers(self.session)
+        self.assertEqual(all_zoo_keepers, self.handler.get_all_zoo_keepers(self.session))
+        self.assertEqual(len(cache), 4)
+        mock_get.reset_mock()
+        self.assertEqual(handler.get_all_zoo_keepers(self.session), all_zoo_keepers)
+        mock_get.assert_not_called()
+
+        handler.get_zoo_keeper(self.session, 1, fields='name')
+        mock_get.assert_not_called()
+
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_response_cache_invalidation(self):
+        cache = LookupCache()
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), response_cache=cache)
+        handler.get_all_zoo_keepers(self.session)
+
+        handler.put_zoo_keeper(self.session, '1', {'age': 11})
+        self.assertEqual(cache.get('zoo_keeper', 1)[1]['age'], 11)
+        handler.return_minimal = True
+        handler.put_zoo_keeper(self.session, '1', {'age': 12})
+        self.assertIsNone(cache.get('zoo_keeper', 1))
+        self.assertEqual(json.loads(handler.get_zoo_keeper(self.session, 1)[0])['age'], 12)
+        handler.return_minimal = False
+
+        handler.delete_zoo_keeper(self.session, '2')
+        self.assertIsNone(cache.get('zoo_keeper', 2))
+        handler.patch_zoo_keepers(self.session, {'ids': [3], 'set': {'age': 31}})
+        self.assertIsNone(cache.get('zoo_keeper', 3))
+
+        self.session.query(ZooKeeper).filter(ZooKeeper.id == 4).update({'age': 41, 'version': ZooKeeper.version + 1})
+        self.assertEqual(json.loads(handler.get_zoo_keeper(self.session, 4)[0])['age'], 41)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_response_cache_skips_zoo_service_errors(self, mock_get):
+        mock_get.side_effect = requests.exceptions.Timeout
+        cache = LookupCache()
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), response_cache=cache)
+        handler.get_zoo_keeper(self.session, 1)
+        handler.get_zoo_keeper(self.session, 4)
+        self.assertIsNone(cache.get('zoo_keeper', 1))
+        self.assertIsNotNone(cache.get('zoo_keeper', 4))
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_get_zoo_keeper_etag(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        handler = DBRequestHandler(ZooServiceRequestHandler("http://localhost:8080"), response_cache=LookupCache())
+        body, code, headers = handler.get_zoo_keeper(self.session, 1)
+        etag = headers['ETag'].strip('"')
+        self.assertTrue(etag.startswith('1-'))
+        self.assertEqual(handler.get_zoo_keeper(self.session, 1), (body, 200, headers))
+
+        mock_get.reset_mock()
+        self.assertEqual(handler.get_zoo_keeper(self.session, 1, if_none_match={etag}), ('', 304, headers))
+        self.assertEqual(handler.get_zoo_keeper(self.session, 1, if_none_match={'*'})[1], 304)
+        self.assertEqual(handler.get_zoo_keeper(self.session, 1, if_none_match={'other'})[1], 200)
+        mock_get.assert_not_called()
+
+        handler.put_zoo_keeper(self.session, 1, {'age': 11})
+        new_headers = handler.get_zoo_keeper(self.session, 1, if_none_match={etag})[2]
+        self.assertTrue(new_headers['ETag'].startswith('"2-'))
+        self.assertEqual(handler.get_zoo_keeper(self.session, 1, if_none_match={etag})[1], 200)
+
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_get_all_zoo_keepers_etag(self):
+        body, code, headers = self.handler.get_all_zoo_keepers(self.session, limit=2)
+        self.assertEqual(json.loads(body), json.loads(self.handler.get_all_zoo_keepers(self.session)[0])[:2])
+        etag = headers['ETag'].strip('"')
+
+        response = self.handler.get_all_zoo_keepers(self.session, limit=2, if_none_match={etag})
+        self.assertEqual(response, ('', 304, headers))
+        self.assertNotEqual(self.handler.get_all_zoo_keepers(self.session, limit=3)[2]['ETag'], headers['ETag'])
+
+        self.handler.patch_zoo_keepers(self.session, {'ids': [2], 'set': {'age': 21}})
+        response = self.handler.get_all_zoo_keepers(self.session, limit=2, if_none_match={etag})
+        self.assertEqual(response[1], 200)
+
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_if_match(self):
+        etag = self.handler.get_zoo_keeper(self.session, 1)[2]['ETag'].strip('"')
+        self.handler.put_zoo_keeper(self.session, '1', {'age': 11}, if_match={etag})
+        self.assertRaises(StaleVersion, self.handler.put_zoo_keeper, self.session, '1', {'age': 12}, if_match={etag})
+        self.assertRaises(StaleVersion, self.handler.delete_zoo_keeper, self.session, '1', if_match={etag})
+
+        self.handler.put_zoo_keeper(self.session, '1', {'age': 12}, if_match={'*'})
+        self.assertEqual(json.loads(self.handler.get_zoo_keeper(self.session, 1)[0])['age'], 12)
+        self.assertRaises(StaleVersion, self.handler.delete_zoo_keeper, self.session, '1', if_match=set())
+        self.handler.delete_zoo_keeper(self.session, '1', if_match={'3-anything'})
+        self.assertRaises(BadId, self.handler.get_zoo_keeper, self.session, 1)
@@ -0,0 +1,42 @@
+import unittest
+from unittest.mock import patch
+
+from zoo_keeper_server.deadline import Deadline, DeadlineExceeded
+
+MONOTONIC_PATCH = 'zoo_keeper_server.deadline.time.monotonic'
+
+
+class TestDeadline(unittest.TestCase):
+
+    @patch(MONOTONIC_PATCH)
+    def test_remaining(self, mock_time):
+        mock_time.return_value = 100.
+        deadline = Deadline(5)
+        self.assertEqual(deadline.remaining(), 5)
+        self.assertFalse(deadline.expired())
+
+        mock_time.return_value = 103.
+        self.assertEqual(deadline.remaining(), 2)
+
+        mock_time.return_value = 106.
+        self.assertEqual(deadline.remaining(), 0)
+        self.assertTrue(deadline.expired())
+
+    @patch(MONOTONIC_PATCH)
+    def test_get_timeout(self, mock_time):
+        mock_time.return_value = 100.
+        deadline = Deadline(5)
+        self.assertEqual(deadline.get_timeout(2), 2)
+        mock_time.return_value = 104.
+        self.assertEqual(deadline.get_timeout(2), 1)
+
+    @patch(MONOTONIC_PATCH)
+    def test_raise_if_expired(self, mock_time):
+        mock_time.return_value = 100.
+        deadline = Deadline(5)
+        self.assertIsNone(deadline.raise_if_expired('query'))
+
+        mock_time.return_value = 105.
+        with self.assertRaises(DeadlineExceeded) as cm:
+            deadline.raise_if_expired('query')
+        self.assertEqual(cm.exception.args[0], 'deadline of 5 seconds exceeded before: query')
@@ -2,14 +2,24 @@ import unittest
 from unittest.mock import patch
 
 import json
+import time
 
 from zoo_keeper_server import flask_app
 from zoo_keeper_server.db_request_handler import DBRequestHandler, BadData, BadId
+from zoo_keeper_server.deadline import DeadlineExceeded
+from zoo_keeper_server.enrichment_executor import EnrichmentExecutor
+from zoo_keeper_server.circuit_breaker import ZooServiceBreakers
+from zoo_keeper_server.lookup_cache import ZooServiceCache, ZooKeeperCache
+from zoo_keeper_server.replica_router import DataBaseReplicas
+from zoo_keeper_server.retry_policy import ZooServiceRetryPolicy
+from zoo_keeper_server.single_flight import ZooServiceFlights
+from zoo_keeper_server.zoo_service_session import ZooServiceSession
 from tests.create_test_data import TestSession, create_simple_test_data
 from tests.mock_requests import MockRequests
 
 HANDLER_PATCH_STR = 'zoo_keeper_server.flask_app.DBRequestHandler'
 SESSION_PATCH_STR = 'zoo_keeper_server.data_base_session.DataBaseSession'
+REQUESTS_GET_PATCH = 'requests.Session.get'
 
 
 class TestFlaskApp(unittest.TestCase):
@@ -20,8 +30,13 @@ class TestFlaskApp(unittest.TestCase):
         flask_app.app.testing = True
         create_simple_test_data(self.session)
         TestSession.reset_close_count()
+        ZooServiceCache.clear()
+        ZooKeeperCache.clear()
+        ZooServiceBreakers.clear()
+        ZooServiceRetryPolicy.clear()
+        ZooServiceFlights.clear()
 
-    @patch('requests.get', MockRequests.get)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
     @patch(SESSION_PATCH_STR, TestSession)
     def test_all_zoo_keepers_get(self):
         response = self.app.get('/zoo_keepers/')
@@ -40,7 +55,7 @@ class TestFlaskApp(unittest.TestCase):
         self.assertEqual(TestSession.close_counts(), 1)
 
     @patch(SESSION_PATCH_STR, TestSession)
-    @patch("requests.get", MockRequests.get)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
     def test_all_zoo_keepers_post(self):
 
         json_data = {'name': 'q', 'age': 5}
@@ -107,7 +122,223 @@ class TestFlaskApp(unittest.TestCase):
         handler_instance.get_all_zoo_keepers.assert_called_once_with(session_instance)
         session_instance.close.assert_called_once_with()
 
-    @patch("requests.get", MockRequests.get)
+    @patch(SESSION_PATCH_STR, TestSession)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_all_zoo_keepers_get_pages(self):
+        response = self.app.get('/zoo_keepers/?limit=1')
+        self.assertEqual([keeper['id'] for keeper in json.loads(response.data)], [1])
+        self.assertEqual(response.headers['Link'], '<?after=1&limit=1>; rel="next"')
+
+        response = self.app.get('/zoo_keepers/?after=1&limit=1')
+        self.assertEqual([keeper['id'] for keeper in json.loads(response.data)], [2])
+        self.assertNotIn('Link', response.headers)
+
+        response = self.app.get('/zoo_keepers/?limit=oops')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)['error_type'], 'BadData')
+
+    @patch(SESSION_PATCH_STR, TestSession)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_all_zoo_keepers_get_stream(self):
+        expected = json.loads(self.app.get('/zoo_keepers/').data)
+        TestSession.reset_close_count()
+
+        response = self.app.get('/zoo_keepers/?stream=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertEqual(json.loads(response.data), expected)
+        self.assertEqual(TestSession.close_counts(), 1)
+
+        response = self.app.get('/zoo_keepers/', headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual([json.loads(line) for line in response.data.splitlines()], expected)
+
+        response = self.app.get('/zoo_keepers/?stream=true&after=1')
+        self.assertEqual(json.loads(response.data), expected[1:])
+
+        for query in ('after=1000', 'zoo_id=999'):
+            response = self.app.get('/zoo_keepers/?' + query, headers={'Accept': 'application/x-ndjson'})
+            self.assertEqual((response.status_code, response.data), (200, b''))
+            response = self.app.get('/zoo_keepers/?stream=true&' + query)
+            self.assertEqual(json.loads(response.data), [])
+
+        response = self.app.get('/zoo_keepers/?stream=true&after=oops')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)['error_type'], 'BadData')
+
+    @patch(SESSION_PATCH_STR, TestSession)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_bulk_zoo_keepers_post(self):
+        response = self.app.post('/zoo_keepers/bulk', json=[{'name': 'q', 'age': 5}, {'name': 'a', 'age': 6}])
+        self.assertEqual(response.status_code, 200)
+        response_json = json.loads(response.data)
+        self.assertEqual([result['status'] for result in response_json['results']], [201, 400])
+        self.assertNotIn('zoo', response_json['results'][0]['zoo_keeper'])
+        self.assertEqual(TestSession.close_counts(), 1)
+
+        ndjson = '{"name": "r", "age": 7, "zoo_id": 1}\n{"name": "s", "age": 8}\n'
+        response = self.app.post(
+            '/zoo_keepers/bulk?enrich=true', data=ndjson, content_type='application/x-ndjson'
+        )
+        response_json = json.loads(response.data)
+        self.assertEqual(response_json['created'], 2)
+        self.assertEqual(response_json['results'][0]['zoo_keeper']['zoo']['id'], 1)
+
+    @patch(SESSION_PATCH_STR, TestSession)
+    def test_bulk_zoo_keepers_post_bad_body(self):
+        response = self.app.post('/zoo_keepers/bulk', json={'name': 'q', 'age': 5})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.app.post('/zoo_keepers/bulk', data='{"name": "q"\noops', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+
+    @patch(SESSION_PATCH_STR, TestSession)
+    def test_bulk_zoo_keepers_patch_delete(self):
+        response = self.app.patch('/zoo_keepers/bulk', json={'ids': [1, 2], 'set': {'age': 9}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data), {'updated': 2, 'ids': [1, 2], 'missing': []})
+
+        response = self.app.delete('/zoo_keepers/bulk', json={'filter': {'age': 9}})
+        self.assertEqual(json.loads(response.data), {'deleted': 2, 'ids': [1, 2]})
+
+        response = self.app.delete('/zoo_keepers/bulk', json={'filter': {}})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(TestSession.close_counts(), 3)
+
+    @patch(SESSION_PATCH_STR, TestSession)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_prefer_return_minimal(self):
+        minimal = {'Prefer': 'return=minimal'}
+        response = self.app.post('/zoo_keepers/', json={'name': 'q', 'age': 5}, headers=minimal)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.headers['Location'].endswith('/zoo_keepers/3'))
+        self.assertNotIn('zoo', json.loads(response.data))
+
+        response = self.app.put('/zoo_keepers/3', json={'age': 6}, headers=minimal)
+        self.assertEqual(response.status_code, 204)
+
+        response = self.app.delete('/zoo_keepers/3', headers=minimal)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.data, b'')
+
+        with patch.object(flask_app, 'ZOO_KEEPERS_RETURN_MINIMAL', True):
+            response = self.app.delete('/zoo_keepers/2')
+            self.assertEqual(response.status_code, 204)
+
+            response = self.app.delete('/zoo_keepers/1', headers={'Prefer': 'return=representation'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.data), [])
+
+    @patch(SESSION_PATCH_STR, TestSession)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_zoo_keepers_fields_and_expand(self):
+        response = self.app.get('/zoo_keepers/?fields=name&limit=1')
+        self.assertEqual(json.loads(response.data), [{'id': 1, 'name': 'a'}])
+
+        response = self.app.get('/zoo_keepers/1?fields=zoo_id&expand=zoo')
+        self.assertEqual(json.loads(response.data)['zoo']['id'], 1)
+
+        response = self.app.get('/zoo_keepers/?stream=true&fields=name')
+        self.assertEqual(json.loads(response.data), [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}])
+
+        response = self.app.get('/zoo_keepers/1?fields=oops')
+        self.assertEqual(response.status_code, 400)
+
+    @patch(SESSION_PATCH_STR, TestSession)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_all_zoo_keepers_get_filters(self):
+        response = self.app.get('/zoo_keepers/?zoo_id=null&fields=name')
+        self.assertEqual(json.loads(response.data), [{'id': 2, 'name': 'b'}])
+
+        response = self.app.get('/zoo_keepers/?stream=true&min_age=1&max_age=1&name_prefix=a&fields=name')
+        self.assertEqual(json.loads(response.data), [{'id': 1, 'name': 'a'}])
+
+        response = self.app.get('/zoo_keepers/?min_age=old')
+        self.assertEqual(response.status_code, 400)
+
+    @patch(SESSION_PATCH_STR, TestSession)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_all_zoo_keepers_get_ids(self):
+        response = self.app.get('/zoo_keepers/?ids=2,5&fields=name')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data), {'zoo_keepers': [{'id': 2, 'name': 'b'}], 'missing': [5]})
+        self.assertEqual(TestSession.close_counts(), 1)
+
+        response = self.app.get('/zoo_keepers/?ids=two')
+        self.assertEqual(response.status_code, 400)
+
+    def test_zoo_service_pool_fits_enrichment_workers(self):
+        self.assertGreaterEqual(ZooServiceSession.pool_maxsize, EnrichmentExecutor.max_workers)
+
+    @patch(SESSION_PATCH_STR, TestSession)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_reads_stick_to_primary_after_write(self):
+        with flask_app.app.test_request_context('/zoo_keepers/'):
+            self.assertTrue(flask_app._is_read_only())
+        with flask_app.app.test_request_context('/zoo_keepers/', method='POST'):
+            self.assertFalse(flask_app._is_read_only())
+
+        response = self.app.put('/zoo_keepers/2', json={'age': 3})
+        self.assertNotIn('Set-Cookie', response.headers)
+        with patch.object(DataBaseReplicas, '_replicas', [object()]):
+            response = self.app.put('/zoo_keepers/2', json={'age': 3})
+            self.assertIn(flask_app.PRIMARY_COOKIE, response.headers['Set-Cookie'])
+            response = self.app.put('/zoo_keepers/100', json={'age': 3})
+            self.assertNotIn('Set-Cookie', response.headers)
+
+        cookie = '{}={}'.format(flask_app.PRIMARY_COOKIE, time.time() + 5)
+        with flask_app.app.test_request_context('/zoo_keepers/', headers={'Cookie': cookie}):
+            self.assertFalse(flask_app._is_read_only())
+        with flask_app.app.test_request_context('/zoo_keepers/', headers={'Cookie': 'db_primary_until=1'}):
+            self.assertTrue(flask_app._is_read_only())
+
+    @patch(SESSION_PATCH_STR, TestSession)
+    @patch(REQUESTS_GET_PATCH)
+    def test_zoo_keeper_response_cache(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        first = self.app.get('/zoo_keepers/1')
+        calls = mock_get.call_count
+        self.assertEqual(self.app.get('/zoo_keepers/1').data, first.data)
+        self.assertEqual(mock_get.call_count, calls)
+
+        self.app.put('/zoo_keepers/1', json={'age': 3})
+        self.assertEqual(json.loads(self.app.get('/zoo_keepers/1').data)['age'], 3)
+
+    @patch(SESSION_PATCH_STR, TestSession)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_conditional_requests(self):
+        response = self.app.get('/zoo_keepers/1')
+        etag = response.headers['ETag']
+        response = self.app.get('/zoo_keepers/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        collection_etag = self.app.get('/zoo_keepers/').headers['ETag']
+        response = self.app.get('/zoo_keepers/', headers={'If-None-Match': collection_etag})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.app.put('/zoo_keepers/1', json={'age': 5}, headers={'If-Match': 'W/' + etag})
+        self.assertEqual(response.status_code, 412)
+        response = self.app.put('/zoo_keepers/1', json={'age': 5}, headers={'If-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        response = self.app.put('/zoo_keepers/1', json={'age': 6}, headers={'If-Match': etag})
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(json.loads(response.data)['error_type'], 'StaleVersion')
+        response = self.app.delete('/zoo_keepers/1', headers={'If-Match': etag})
+        self.assertEqual(response.status_code, 412)
+
+        response = self.app.get('/zoo_keepers/1', headers={'If-None-Match': etag})
+        self.assertEqual(json.loads(response.data)['age'], 5)
+
+        response = self.app.get('/zoo_keepers/1')
+        self.assertEqual(self.app.get('/zoo_keepers/1', headers={'If-None-Match': 'W/' + etag}).status_code, 200)
+        response = self.app.get('/zoo_keepers/1', headers={'If-None-Match': 'W/' + response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        response = self.app.delete('/zoo_keepers/1', headers={'Prefer': 'return=representation'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response.headers)
+
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
     def test_all_monkeys_get(self):
         response = self.app.get('/monkeys/')
         expected =[
@@ -131,7 +362,7 @@ class TestFlaskApp(unittest.TestCase):
 
         handler_instance.get_all_monkeys.assert_called_once_with()
 
-    @patch("requests.get", MockRequests.get)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
     def test_all_zoos_get(self):
         response = self.app.get('/zoos/')
         expected =[
@@ -154,7 +385,7 @@ class TestFlaskApp(unittest.TestCase):
         handler_instance.get_all_zoos.assert_called_once_with()
 
     @patch(SESSION_PATCH_STR, TestSession)
-    @patch("requests.get", MockRequests.get)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
     def test_zoo_keeper_by_id_get(self):
 
         response = self.app.get('/zoo_keepers/2')
@@ -185,8 +416,52 @@ class TestFlaskApp(unittest.TestCase):
         handler_instance.get_zoo_keeper.assert_called_once_with(session_instance, '100')
         session_instance.close.assert_called_once_with()
 
+    @patch(SESSION_PATCH_STR)
+    @patch(HANDLER_PATCH_STR)
+    def test_zoo_keeper_by_id_deadline_exceeded(self, handler_class, session_class):
+        handler_instance, session_instance = create_instances(handler_class, session_class)
+        handler_instance.get_zoo_keeper.side_effect = DeadlineExceeded('too slow')
+
+        response = self.app.get('/zoo_keepers/1')
+        expected = {
+            'error': 504,
+            'error_type': 'DeadlineExceeded',
+            'title': 'gateway timeout',
+            'text': 'too slow'
+        }
+        self.assertEqual(json.loads(response.data), expected)
+        self.assertEqual(response.status_code, 504)
+        session_instance.close.assert_called_once_with()
+
+    @patch(SESSION_PATCH_STR)
+    @patch(HANDLER_PATCH_STR)
+    def test_deadline_header(self, handler_class, session_class):
+        handler_instance, session_instance = create_instances(handler_class, session_class)
+        handler_instance.get_zoo_keeper.return_value = 'ok', 200
+
+        self.app.get('/zoo_keepers/1')
+        self.assertEqual(handler_class.call_args[1]['deadline'].budget, flask_app.REQUEST_DEADLINE)
+
+        self.app.get('/zoo_keepers/1', headers={'X-Request-Deadline': '1.5'})
+        self.assertEqual(handler_class.call_args[1]['deadline'].budget, 1.5)
+        self.assertIs(handler_class.call_args[0][0].deadline, handler_class.call_args[1]['deadline'])
+
+        self.app.get('/zoo_keepers/1', headers={'X-Request-Deadline': '1000'})
+        self.assertEqual(handler_class.call_args[1]['deadline'].budget, flask_app.REQUEST_DEADLINE)
+
+    @patch(SESSION_PATCH_STR)
+    @patch(HANDLER_PATCH_STR)
+    def test_deadline_header_bad_value(self, handler_class, session_class):
+        handler_instance, session_instance = create_instances(handler_class, session_class)
+
+        response = self.app.get('/zoo_keepers/1', headers={'X-Request-Deadline': 'soon'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)['error_type'], 'BadRequest')
+        handler_instance.get_zoo_keeper.assert_not_called()
+        session_instance.close.assert_called_once_with()
+
     @patch(SESSION_PATCH_STR, TestSession)
-    @patch("requests.get", MockRequests.get)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
     def test_zoo_keeper_by_id_delete(self):
         response = self.app.delete('/zoo_keepers/1')
         all_keepers = [
@@ -223,7 +498,7 @@ class TestFlaskApp(unittest.TestCase):
         session_instance.close.assert_called_once_with()
 
     @patch(SESSION_PATCH_STR, TestSession)
-    @patch("requests.get", MockRequests.get)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
     def test_zoo_keeper_by_id_put(self):
 
         response = self.app.put('/zoo_keepers/2', json={'age': 100})
@@ -0,0 +1,148 @@
+import unittest
+from unittest.mock import patch
+
+from zoo_keeper_server.lookup_cache import LookupCache, NotFound
+
+MONOTONIC_PATCH = 'zoo_keeper_server.lookup_cache.time.monotonic'
+
+
+class TestLookupCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LookupCache(max_entries=3, ttls={'zoo': 10, 'monkey': 5}, default_ttl=1, negative_ttl=2)
+
+    def test_defaults(self):
+        cache = LookupCache()
+        self.assertEqual(cache.max_entries, 1000)
+        self.assertEqual(cache.get_ttl('zoo'), 300)
+        self.assertEqual(cache.negative_ttl, 30)
+        self.assertEqual(cache.stats(), {'entries': 0, 'hits': 0, 'negative_hits': 0, 'misses': 0, 'evictions': 0})
+
+    def test_get_ttl(self):
+        self.assertEqual(self.cache.get_ttl('zoo'), 10)
+        self.assertEqual(self.cache.get_ttl('monkey'), 5)
+        self.assertEqual(self.cache.get_ttl('other'), 1)
+
+    def test_get_miss_and_hit(self):
+        self.assertIsNone(self.cache.get('zoo', 1))
+        self.cache.set('zoo', 1, {'id': 1})
+        self.assertEqual(self.cache.get('zoo', 1), {'id': 1})
+        self.assertIsNone(self.cache.get('monkey', 1))
+        self.assertEqual(self.cache.stats(), {'entries': 1, 'hits': 1, 'negative_hits': 0, 'misses': 2, 'evictions': 0})
+
+    @patch(MONOTONIC_PATCH)
+    def test_entries_expire_per_entity(self, mock_time):
+        mock_time.return_value = 100.
+        self.cache.set('zoo', 1, {'id': 1})
+        self.cache.set('monkey', 1, {'id': 1})
+
+        mock_time.return_value = 104.
+        self.assertIsNotNone(self.cache.get('zoo', 1))
+        self.assertIsNotNone(self.cache.get('monkey', 1))
+
+        mock_time.return_value = 105.
+        self.assertIsNotNone(self.cache.get('zoo', 1))
+        self.assertIsNone(self.cache.get('monkey', 1))
+
+        mock_time.return_value = 110.
+        self.assertIsNone(self.cache.get('zoo', 1))
+
+    @patch(MONOTONIC_PATCH)
+    def test_set_with_ttl(self, mock_time):
+        mock_time.return_value = 100.
+        self.cache.set('zoo', 1, {'id': 1}, ttl=2)
+        mock_time.return_value = 102.
+        self.assertIsNone(self.cache.get('zoo', 1))
+
+    @patch(MONOTONIC_PATCH)
+    def test_set_not_found_uses_negative_ttl(self, mock_time):
+        mock_time.return_value = 100.
+        self.cache.set_not_found('zoo', 1, 'oops')
+
+        mock_time.return_value = 101.
+        not_found = self.cache.get('zoo', 1)
+        self.assertIsInstance(not_found, NotFound)
+        self.assertEqual(not_found.error_text, 'oops')
+
+        mock_time.return_value = 102.
+        self.assertIsNone(self.cache.get('zoo', 1))
+        self.assertEqual(self.cache.stats(), {'entries': 1, 'hits': 0, 'negative_hits': 1, 'misses': 1, 'evictions': 0})
+
+    def test_peek_does_not_count_misses(self):
+        self.assertIsNone(self.cache.peek('zoo', 1))
+        self.cache.set('zoo', 1, {'id': 1})
+        self.cache.set_not_found('zoo', 2, 'nope')
+        self.assertEqual(self.cache.peek('zoo', 1), {'id': 1})
+        self.assertIsInstance(self.cache.peek('zoo', 2), NotFound)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['negative_hits'], stats['misses']), (1, 1, 0))
+
+    @patch(MONOTONIC_PATCH)
+    def test_get_stale(self, mock_time):
+        mock_time.return_value = 100.
+        self.cache.set('zoo', 1, {'id': 1}, validators={'If-None-Match': '"a"'})
+        self.cache.set('zoo', 2, {'id': 2})
+        self.cache.set_not_found('zoo', 3, 'nope')
+
+        mock_time.return_value = 120.
+        self.assertIsNone(self.cache.get('zoo', 1))
+        entry = self.cache.get_stale('zoo', 1)
+        self.assertEqual((entry.value, entry.validators), ({'id': 1}, {'If-None-Match': '"a"'}))
+        self.assertEqual(self.cache.get_stale('zoo', 2).validators, {})
+        self.assertIsNone(self.cache.get_stale('zoo', 3))
+        self.assertIsNone(self.cache.get_stale('zoo', 4))
+
+    @patch(MONOTONIC_PATCH)
+    def test_stale_windows(self, mock_time):
+        mock_time.return_value = 100.
+        self.cache.configure(stale_while_revalidate=5, stale_if_error=20)
+        self.cache.set('zoo', 1, {'id': 1})
+        entry = self.cache.get_stale('zoo', 1)
+
+        mock_time.return_value = 114.
+        self.assertTrue(self.cache.can_serve_while_revalidating(entry))
+        self.assertTrue(self.cache.can_serve_on_error(entry))
+        mock_time.return_value = 116.
+        self.assertFalse(self.cache.can_serve_while_revalidating(entry))
+        self.assertTrue(self.cache.can_serve_on_error(entry))
+        mock_time.return_value = 131.
+        self.assertFalse(self.cache.can_serve_on_error(entry))
+
+    def test_one_refresh_at_a_time(self):
+        self.assertTrue(self.cache.start_refresh('zoo', 1))
+        self.assertFalse(self.cache.start_refresh('zoo', 1))
+        self.assertTrue(self.cache.start_refresh('monkey', 1))
+        self.cache.finish_refresh('zoo', 1)
+        self.assertTrue(self.cache.start_refresh('zoo', 1))
+
+    def test_least_recently_used_is_evicted(self):
+        for zoo_id in (1, 2, 3):
+            self.cache.set('zoo', zoo_id, {'id': zoo_id})
+        self.cache.get('zoo', 1)
+        self.cache.set('zoo', 4, {'id': 4})
+
+        self.assertEqual(len(self.cache), 3)
+        self.assertIsNone(self.cache.get('zoo', 2))
+        for zoo_id in (1, 3, 4):
+            self.assertEqual(self.cache.get('zoo', zoo_id), {'id': zoo_id})
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_invalidate(self):
+        self.cache.set('zoo', 1, {'id': 1})
+        self.cache.invalidate('zoo', 1)
+        self.cache.invalidate('zoo', 2)
+        self.assertIsNone(self.cache.get('zoo', 1))
+
+    def test_configure_clears_entries(self):
+        self.cache.set('zoo', 1, {'id': 1})
+        self.cache.configure(max_entries=10, ttls={'zoo': 20})
+        self.assertEqual(self.cache.max_entries, 10)
+        self.assertEqual(self.cache.get_ttl('zoo'), 20)
+        self.assertEqual(self.cache.get_ttl('monkey'), 5)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_clear(self):
+        self.cache.set('zoo', 1, {'id': 1})
+        self.cache.get('zoo', 1)
+        self.cache.clear()
+        self.assertEqual(self.cache.stats(), {'entries': 0, 'hits': 0, 'negative_hits': 0, 'misses': 0, 'evictions': 0})
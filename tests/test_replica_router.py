@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+
+from zoo_keeper_server.data_base_session import data_base_session_scope
+from zoo_keeper_server.replica_router import ReplicaRouter, ROUND_ROBIN, LEAST_CONNECTIONS
+
+REPLICAS_PATCH = 'zoo_keeper_server.data_base_session.DataBaseReplicas'
+
+
+class TestReplicaRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.replicas = ['replica_0', 'replica_1', 'replica_2']
+
+    def test_no_replicas(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.acquire())
+        self.assertEqual(router.stats(), [])
+        self.assertEqual(len(router), 0)
+        self.assertEqual(len(ReplicaRouter(self.replicas)), 3)
+
+    def test_round_robin(self):
+        router = ReplicaRouter(self.replicas, ROUND_ROBIN)
+        acquired = [router.acquire() for _ in range(4)]
+        self.assertEqual(acquired, ['replica_0', 'replica_1', 'replica_2', 'replica_0'])
+        self.assertEqual(router.stats(), [2, 1, 1])
+
+        for replica in acquired:
+            router.release(replica)
+        self.assertEqual(router.stats(), [0, 0, 0])
+
+    def test_least_connections(self):
+        router = ReplicaRouter(self.replicas, LEAST_CONNECTIONS)
+        self.assertEqual([router.acquire() for _ in range(3)], self.replicas)
+
+        router.release('replica_1')
+        self.assertEqual(router.acquire(), 'replica_1')
+        router.release('replica_2')
+        router.release('replica_2')
+        self.assertEqual(router.stats(), [1, 1, 0])
+        self.assertEqual(router.acquire(), 'replica_2')
+
+    def test_configure(self):
+        router = ReplicaRouter(self.replicas)
+        router.acquire()
+        router.configure(strategy=LEAST_CONNECTIONS)
+        self.assertEqual(router.strategy, LEAST_CONNECTIONS)
+        self.assertEqual(router.stats(), [1, 0, 0])
+
+        router.configure(replicas=['replica_3'])
+        self.assertEqual(router.acquire(), 'replica_3')
+        router.release('replica_0')
+        self.assertEqual(router.stats(), [1])
+
+        self.assertRaises(ValueError, router.configure, strategy='random')
+        self.assertRaises(ValueError, ReplicaRouter, strategy='random')
+
+    def test_read_only_session_scope_uses_replica(self):
+        replica = create_engine('sqlite:///:memory:')
+        router = ReplicaRouter([replica])
+        with patch(REPLICAS_PATCH, router):
+            with data_base_session_scope(read_only=True) as session:
+                self.assertIs(session.bind, replica)
+                self.assertEqual(router.stats(), [1])
+            self.assertEqual(router.stats(), [0])
+
+            with data_base_session_scope() as session:
+                self.assertIsNot(session.bind, replica)
+            self.assertEqual(router.stats(), [0])
@@ -0,0 +1,70 @@
+import unittest
+from unittest.mock import patch
+
+from zoo_keeper_server.retry_policy import RetryPolicy
+
+UNIFORM_PATCH = 'zoo_keeper_server.retry_policy.random.uniform'
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = RetryPolicy(base_delay=0.1, max_delay=0.5, budget_ratio=0.5, retry_reserve=2)
+
+    def test_defaults(self):
+        policy = RetryPolicy()
+        self.assertEqual(policy.base_delay, 0.05)
+        self.assertEqual(policy.max_delay, 1.)
+        self.assertEqual(policy.budget_ratio, 0.2)
+        self.assertEqual(policy.retry_reserve, 10)
+        self.assertEqual(policy.stats(), {})
+
+    @patch(UNIFORM_PATCH)
+    def test_get_delay_is_full_jitter_of_capped_exponential(self, mock_uniform):
+        mock_uniform.side_effect = lambda low, high: (low, high)
+        delays = [self.policy.get_delay(retry_number) for retry_number in range(1, 6)]
+        expected = [(0, 0.1), (0, 0.2), (0, 0.4), (0, 0.5), (0, 0.5)]
+        self.assertEqual(delays, expected)
+
+    def test_get_delay_in_range(self):
+        for _ in range(100):
+            self.assertTrue(0 <= self.policy.get_delay(2) <= 0.2)
+
+    def test_budget_starts_with_reserve(self):
+        self.assertTrue(self.policy.try_retry('zoos'))
+        self.assertTrue(self.policy.try_retry('zoos'))
+        self.assertFalse(self.policy.try_retry('zoos'))
+
+    def test_requests_refill_budget_by_ratio(self):
+        for _ in range(2):
+            self.policy.try_retry('zoos')
+        self.policy.record_request('zoos')
+        self.assertFalse(self.policy.try_retry('zoos'))
+        self.policy.record_request('monkeys')
+        self.assertTrue(self.policy.try_retry('monkeys'))
+        self.assertFalse(self.policy.try_retry('monkeys'))
+
+    def test_budget_never_exceeds_reserve(self):
+        for _ in range(100):
+            self.policy.record_request('zoos')
+        self.assertTrue(self.policy.try_retry('zoos'))
+        self.assertTrue(self.policy.try_retry('zoos'))
+        self.assertFalse(self.policy.try_retry('zoos'))
+
+    def test_stats_per_endpoint(self):
+        self.policy.record_request('zoos')
+        self.policy.try_retry('zoos')
+        self.policy.try_retry('zoos')
+        self.policy.try_retry('monkeys')
+        expected = {
+            'zoos': {'requests': 1, 'retries': 2, 'budget_exhausted': 0},
+            'monkeys': {'requests': 0, 'retries': 0, 'budget_exhausted': 1},
+        }
+        self.assertEqual(self.policy.stats(), expected)
+
+    def test_clear(self):
+        for _ in range(2):
+            self.policy.try_retry('zoos')
+        self.policy.clear()
+        self.assertEqual(self.policy.stats(), {})
+        self.assertTrue(self.policy.try_retry('zoos'))
@@ -0,0 +1,100 @@
+import threading
+import time
+import unittest
+
+from zoo_keeper_server.single_flight import SingleFlight, FlightTimeout
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def _slow(self, result=None, error=None):
+        def function():
+            self.calls += 1
+            self.started.set()
+            self.release.wait(5)
+            if error is not None:
+                raise error
+            return result
+        return function
+
+    def _run_concurrently(self, function, callers=4, key='a') -> list:
+        outcomes = [None] * callers
+
+        def call(index):
+            try:
+                outcomes[index] = self.flights.do(key, function)
+            except Exception as e:
+                outcomes[index] = e
+
+        threads = [threading.Thread(target=call, args=(0,))]
+        threads[0].start()
+        self.started.wait(5)
+        threads += [threading.Thread(target=call, args=(index,)) for index in range(1, callers)]
+        for thread in threads[1:]:
+            thread.start()
+        while self.flights.stats()['coalesced'] < callers - 1:
+            time.sleep(0.01)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return outcomes
+
+    def test_concurrent_calls_share_the_result(self):
+        self.assertEqual(self._run_concurrently(self._slow(result={'id': 1})), [{'id': 1}] * 4)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flights.stats(), {'in_flight': 0, 'leaders': 1, 'coalesced': 3})
+
+    def test_concurrent_calls_share_the_error(self):
+        error = ValueError('down')
+        self.assertEqual(self._run_concurrently(self._slow(error=error)), [error] * 4)
+        self.assertEqual(self.calls, 1)
+
+    def test_unshared_error_is_retried_by_waiting_callers(self):
+        error = ValueError('own deadline')
+
+        def lead():
+            with self.assertRaises(ValueError):
+                self.flights.do('a', self._slow(error=error), is_shared=lambda e: e is not error)
+
+        leader = threading.Thread(target=lead)
+        leader.start()
+        self.started.wait(5)
+        outcomes = []
+        follower = threading.Thread(target=lambda: outcomes.append(self.flights.do('a', lambda: 'own result')))
+        follower.start()
+        while self.flights.stats()['coalesced'] < 1:
+            time.sleep(0.01)
+        self.release.set()
+        leader.join(5)
+        follower.join(5)
+        self.assertEqual(outcomes, ['own result'])
+        self.assertEqual(self.flights.stats(), {'in_flight': 0, 'leaders': 2, 'coalesced': 1})
+
+    def test_sequential_calls_are_not_coalesced(self):
+        self.release.set()
+        self.assertEqual(self.flights.do('a', self._slow(result=1)), 1)
+        self.assertEqual(self.flights.do('a', self._slow(result=2)), 2)
+        self.assertEqual(self.flights.do('b', self._slow(result=3)), 3)
+        self.assertEqual(self.flights.stats(), {'in_flight': 0, 'leaders': 3, 'coalesced': 0})
+
+    def test_coalesced_call_timeout(self):
+        thread = threading.Thread(target=self.flights.do, args=('a', self._slow()))
+        thread.start()
+        self.started.wait(5)
+        self.assertEqual(self.flights.stats()['in_flight'], 1)
+        self.assertRaises(FlightTimeout, self.flights.do, 'a', self._slow(), 0.01)
+        self.release.set()
+        thread.join(5)
+        self.assertEqual(self.calls, 1)
+
+    def test_clear(self):
+        self.release.set()
+        self.flights.do('a', self._slow())
+        self.flights.clear()
+        self.assertEqual(self.flights.stats(), {'in_flight': 0, 'leaders': 0, 'coalesced': 0})
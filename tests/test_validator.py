@@ -1,14 +1,16 @@
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, call
 
 import requests
 
 from tests.mock_requests import MockRequests
 
+from zoo_keeper_server.lookup_cache import LookupCache
 from zoo_keeper_server.zoo_service_request_handler import NoResponse
 from zoo_keeper_server.validator import Validator
 
-PATCH_REQUESTS_STRING = 'zoo_keeper_server.zoo_service_request_handler.requests'
+REQUESTS_GET_PATCH = 'requests.Session.get'
+REQUESTS_HEAD_PATCH = 'requests.Session.head'
 
 
 class TestValidator(unittest.TestCase):
@@ -17,7 +19,8 @@ class TestValidator(unittest.TestCase):
         self.zoo_service_url = "http://localhost:8080"
         self.validator = Validator(self.zoo_service_url)
 
-    @patch(PATCH_REQUESTS_STRING, MockRequests)
+    @patch(REQUESTS_HEAD_PATCH, MockRequests.head)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
     def test_is_zoo_ok(self):
         self.assertTrue(self.validator.is_zoo_ok(1))
         self.assertTrue(self.validator.is_zoo_ok(2))
@@ -25,7 +28,8 @@ class TestValidator(unittest.TestCase):
 
         self.assertFalse(self.validator.is_zoo_ok(3))
 
-    @patch(PATCH_REQUESTS_STRING, MockRequests)
+    @patch(REQUESTS_HEAD_PATCH, MockRequests.head)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
     def test_is_favorite_monkey_ok(self):
         self.assertTrue(self.validator.is_favorite_monkey_ok(1, 1))
         self.assertTrue(self.validator.is_favorite_monkey_ok(2, 1))
@@ -39,7 +43,8 @@ class TestValidator(unittest.TestCase):
         self.assertFalse(self.validator.is_favorite_monkey_ok(5, 1))
         self.assertFalse(self.validator.is_favorite_monkey_ok(1, 5))
 
-    @patch(PATCH_REQUESTS_STRING, MockRequests)
+    @patch(REQUESTS_HEAD_PATCH, MockRequests.head)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
     def test_is_dream_monkey_ok(self):
         self.assertTrue(self.validator.is_dream_monkey_ok(1, 2))
         self.assertTrue(self.validator.is_dream_monkey_ok(2, 2))
@@ -53,7 +58,8 @@ class TestValidator(unittest.TestCase):
         self.assertFalse(self.validator.is_dream_monkey_ok(1, None))
         self.assertFalse(self.validator.is_dream_monkey_ok(5, 1))
 
-    @patch(PATCH_REQUESTS_STRING, MockRequests)
+    @patch(REQUESTS_HEAD_PATCH, MockRequests.head)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
     def test_raise_value_errors_no_errors(self):
         kwargs_sets = [
             {'zoo_id': None, 'favorite_monkey_id': None, 'dream_monkey_id': None},
@@ -64,7 +70,8 @@ class TestValidator(unittest.TestCase):
         for kwargs in kwargs_sets:
             self.assertIsNone(self.validator.raise_value_errors(**kwargs))
 
-    @patch(PATCH_REQUESTS_STRING, MockRequests)
+    @patch(REQUESTS_HEAD_PATCH, MockRequests.head)
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
     def test_raise_value_errors_with_errors(self):
         kwargs_sets = [
             {'zoo_id': None, 'favorite_monkey_id': 1, 'dream_monkey_id': None},
@@ -76,8 +83,8 @@ class TestValidator(unittest.TestCase):
         for kwargs in kwargs_sets:
             self.assertRaises(ValueError, self.validator.raise_value_errors, **kwargs)
 
-    @patch("requests.head")
-    @patch("requests.get")
+    @patch(REQUESTS_HEAD_PATCH)
+    @patch(REQUESTS_GET_PATCH)
     def test_raises_NoResponse_on_timeout(self, mock_get, mock_head):
         mock_get.side_effect = requests.exceptions.Timeout()
         mock_head.side_effect = requests.exceptions.Timeout()
@@ -90,8 +97,8 @@ class TestValidator(unittest.TestCase):
         self.assertRaises(NoResponse, self.validator.raise_value_errors, 1, 1, None)
         self.assertRaises(NoResponse, self.validator.raise_value_errors, 1, None, 1)
 
-    @patch("requests.head")
-    @patch("requests.get")
+    @patch(REQUESTS_HEAD_PATCH)
+    @patch(REQUESTS_GET_PATCH)
     def test_returns_correctly_on_timeout(self, mock_get, mock_head):
         mock_get.side_effect = requests.exceptions.Timeout()
         mock_head.side_effect = requests.exceptions.Timeout()
@@ -113,3 +120,77 @@ class TestValidator(unittest.TestCase):
         for kwargs in kwargs_sets:
             self.assertRaises(ValueError, self.validator.raise_value_errors, **kwargs)
         self.assertIsNone(self.validator.raise_value_errors(None, None, None))
+
+    @patch(REQUESTS_HEAD_PATCH)
+    @patch(REQUESTS_GET_PATCH)
+    def test_cache_removes_repeat_requests(self, mock_get, mock_head):
+        mock_get.side_effect = MockRequests.get
+        validator = Validator(self.zoo_service_url, cache=LookupCache())
+
+        self.assertIsNone(validator.raise_value_errors(1, 1, 3))
+        self.assertIsNone(validator.raise_value_errors(1, 1, 3))
+
+        self.assertEqual(mock_get.call_count, 2)
+        mock_head.assert_not_called()
+
+    @patch(REQUESTS_HEAD_PATCH)
+    @patch(REQUESTS_GET_PATCH)
+    def test_raise_value_errors_fetches_each_record_once(self, mock_get, mock_head):
+        mock_get.side_effect = MockRequests.get
+
+        self.assertIsNone(self.validator.raise_value_errors(1, 2, 3))
+        expected_calls = [
+            call('http://localhost:8080/zoos/1', timeout=2),
+            call('http://localhost:8080/monkeys/3', timeout=2),
+        ]
+        self.assertEqual(mock_get.call_args_list, expected_calls)
+        mock_head.assert_not_called()
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_each_pass_fetches_again(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+
+        self.assertTrue(self.validator.is_favorite_monkey_ok(1, 1))
+        self.assertTrue(self.validator.is_favorite_monkey_ok(1, 1))
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_validate_many(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        zoo_keeper_jsons = [
+            {'name': 'a', 'age': 1},
+            {'zoo_id': 1, 'favorite_monkey_id': 1, 'dream_monkey_id': 3},
+            {'zoo_id': 1, 'favorite_monkey_id': 2, 'dream_monkey_id': 4},
+            {'zoo_id': 2, 'favorite_monkey_id': 3, 'dream_monkey_id': 1},
+            {'zoo_id': 2, 'favorite_monkey_id': 1},
+            {'zoo_id': 1, 'dream_monkey_id': 2},
+            {'zoo_id': 5},
+            {'favorite_monkey_id': 1},
+            {'zoo_id': 1, 'dream_monkey_id': 10},
+        ]
+        expected = [
+            None,
+            None,
+            None,
+            None,
+            'monkey: "1" does not exist or is not in zoo: "2"',
+            'monkey: "2" does not exist or IS in zoo: "1"',
+            'zoo: "5" does not exists',
+            'monkey: "1" does not exist or is not in zoo: "None"',
+            'monkey: "10" does not exist or IS in zoo: "1"',
+        ]
+        self.assertEqual(self.validator.validate_many(zoo_keeper_jsons), expected)
+
+        expected_calls = [
+            call('http://localhost:8080/zoos/1', timeout=2),
+            call('http://localhost:8080/zoos/2', timeout=2),
+            call('http://localhost:8080/zoos/5', timeout=2),
+            call('http://localhost:8080/monkeys/10', timeout=2),
+        ]
+        self.assertEqual(mock_get.call_args_list, expected_calls)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_validate_many_raises_NoResponse_on_timeout(self, mock_get):
+        mock_get.side_effect = requests.exceptions.Timeout()
+        self.assertRaises(NoResponse, self.validator.validate_many, [{'zoo_id': 1}])
+        self.assertEqual(self.validator.validate_many([{'name': 'a'}]), [None])
@@ -1,3 +1,5 @@
+import time
+import threading
 import unittest
 from unittest.mock import patch, call
 
@@ -5,11 +7,20 @@ import json
 
 import requests
 
-from zoo_keeper_server.zoo_service_request_handler import ZooServiceRequestHandler, NoResponse, BadResponse
-from tests.mock_requests import MockRequests
+from zoo_keeper_server.zoo_service_request_handler import (
+    ZooServiceRequestHandler, NoResponse, BadResponse, NotSent, DeadlineCut
+)
+from zoo_keeper_server.circuit_breaker import CircuitBreakers, CLOSED, OPEN
+from zoo_keeper_server.deadline import Deadline
+from zoo_keeper_server.lookup_cache import LookupCache
+from zoo_keeper_server.retry_policy import RetryPolicy
+from zoo_keeper_server.single_flight import SingleFlight
+from zoo_keeper_server.zoo_service_session import PooledSession
+from tests.mock_requests import MockRequests, MockResponse
+from tests.mock_zoo_server import MockZooServer
 
-REQUESTS_GET_PATCH = 'requests.get'
-REQUESTS_HEAD_PATCH = 'requests.head'
+REQUESTS_GET_PATCH = 'requests.Session.get'
+REQUESTS_HEAD_PATCH = 'requests.Session.head'
 
 
 class TestZooServiceRequestHandler(unittest.TestCase):
@@ -241,3 +252,452 @@ class TestZooServiceRequestHandler(unittest.TestCase):
             'text': 'oops'
         }
         self.assertEqual(expected, error_json)
+
+    @patch(REQUESTS_HEAD_PATCH)
+    @patch(REQUESTS_GET_PATCH)
+    def test_cache_serves_repeat_lookups(self, mock_get, mock_head):
+        mock_get.side_effect = MockRequests.get
+        handler = ZooServiceRequestHandler(self.zoo_service_url, cache=LookupCache())
+
+        self.assertEqual(handler.get_monkey(1), {'id': 1, 'zoo_id': 1})
+        self.assertTrue(handler.has_monkey(1))
+        self.assertTrue(handler.is_monkey_in_zoo(1, 1))
+        self.assertFalse(handler.is_monkey_in_zoo(1, 2))
+        self.assertEqual(handler.get_monkey(1), {'id': 1, 'zoo_id': 1})
+
+        mock_get.assert_called_once_with('http://localhost:8080/monkeys/1', timeout=2)
+        mock_head.assert_not_called()
+        self.assertEqual(handler.cache.stats()['hits'], 4)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_cache_has_zoo(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        handler = ZooServiceRequestHandler(self.zoo_service_url, cache=LookupCache())
+
+        self.assertTrue(handler.has_zoo(1))
+        self.assertFalse(handler.has_zoo(10))
+        self.assertEqual(handler.get_zoo(1)['id'], 1)
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_cache_filled_by_get_all(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        handler = ZooServiceRequestHandler(self.zoo_service_url, cache=LookupCache())
+
+        handler.get_all_zoos()
+        handler.get_all_monkeys()
+        self.assertEqual(handler.get_zoo(2), MockRequests.zoo_json(2))
+        self.assertEqual(handler.get_monkey(4), MockRequests.monkey_json(4))
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_cache_does_not_store_timeouts(self, mock_get):
+        mock_get.side_effect = requests.exceptions.Timeout('nope')
+        handler = ZooServiceRequestHandler(self.zoo_service_url, cache=LookupCache())
+
+        self.assertRaises(NoResponse, handler.get_zoo, 1)
+        mock_get.side_effect = MockRequests.get
+        self.assertEqual(handler.get_zoo(1)['id'], 1)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_cache_stores_not_found(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        handler = ZooServiceRequestHandler(self.zoo_service_url, cache=LookupCache())
+
+        with self.assertRaises(BadResponse) as first:
+            handler.get_zoo(10)
+        with self.assertRaises(BadResponse) as second:
+            handler.get_zoo(10)
+        self.assertFalse(handler.has_zoo(10))
+
+        self.assertEqual(first.exception.args, second.exception.args)
+        mock_get.assert_called_once_with('http://localhost:8080/zoos/10', timeout=2)
+        self.assertEqual(handler.cache.stats()['negative_hits'], 2)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_cache_does_not_store_other_errors(self, mock_get):
+        mock_get.return_value = MockResponse({'error': 500}, 500)
+        handler = ZooServiceRequestHandler(self.zoo_service_url, cache=LookupCache())
+
+        self.assertRaises(BadResponse, handler.get_zoo, 1)
+        self.assertRaises(BadResponse, handler.get_zoo, 1)
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_breaker_fails_fast_when_open(self, mock_get):
+        mock_get.side_effect = requests.exceptions.Timeout('nope')
+        handler = ZooServiceRequestHandler(self.zoo_service_url, breakers=CircuitBreakers(failure_threshold=2))
+
+        self.assertRaises(NoResponse, handler.get_zoo, 1)
+        self.assertRaises(NoResponse, handler.get_zoo, 2)
+        self.assertEqual(mock_get.call_count, 6)
+
+        with self.assertRaises(NoResponse) as cm:
+            handler.get_zoo(1)
+        self.assertEqual(mock_get.call_count, 6)
+        expected = {
+            'error': 504,
+            'title': 'gateway timeout',
+            'error_type': 'NoResponse',
+            'text': 'at address: http://localhost:8080/zoos/1, circuit open, not sending request'
+        }
+        self.assertEqual(json.loads(cm.exception.args[0]), expected)
+        self.assertEqual(handler.breakers.get(handler.zoo_addr).state, OPEN)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_breaker_per_endpoint_family(self, mock_get):
+        def get_without_zoos(addr, timeout=1):
+            if '/zoos/' in addr:
+                raise requests.exceptions.Timeout('nope')
+            return MockRequests.get(addr, timeout)
+
+        mock_get.side_effect = get_without_zoos
+        handler = ZooServiceRequestHandler(self.zoo_service_url, breakers=CircuitBreakers(failure_threshold=1))
+
+        self.assertRaises(NoResponse, handler.get_all_zoos)
+        self.assertRaises(NoResponse, handler.get_zoo, 1)
+        self.assertEqual(handler.get_monkey(1), {'id': 1, 'zoo_id': 1})
+        self.assertEqual(handler.get_all_monkeys(), MockRequests.all_monkey_jsons())
+        self.assertEqual(mock_get.call_count, 5)
+
+    @patch('zoo_keeper_server.circuit_breaker.time.monotonic')
+    @patch(REQUESTS_GET_PATCH)
+    def test_breaker_counts_other_request_errors(self, mock_get, mock_time):
+        mock_time.return_value = 100.
+        mock_get.side_effect = requests.exceptions.ChunkedEncodingError('cut off')
+        breakers = CircuitBreakers(failure_threshold=1, reset_timeout=10)
+        handler = ZooServiceRequestHandler(self.zoo_service_url, breakers=breakers)
+
+        self.assertRaises(NoResponse, handler.get_zoo, 1)
+        self.assertEqual(breakers.get(handler.zoo_addr).state, OPEN)
+
+        mock_time.return_value = 110.
+        mock_get.side_effect = RuntimeError('unexpected')
+        self.assertRaises(RuntimeError, handler.get_zoo, 1)
+        self.assertEqual(breakers.get(handler.zoo_addr).state, OPEN)
+        mock_time.return_value = 120.
+        mock_get.side_effect = MockRequests.get
+        self.assertEqual(handler.get_zoo(1), MockRequests.zoo_json(1))
+        self.assertEqual(breakers.get(handler.zoo_addr).state, CLOSED)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_breaker_counts_server_errors(self, mock_get):
+        mock_get.return_value = MockResponse({'error': 500}, 500)
+        handler = ZooServiceRequestHandler(self.zoo_service_url, breakers=CircuitBreakers(failure_threshold=2))
+
+        self.assertRaises(BadResponse, handler.get_monkey, 1)
+        self.assertRaises(BadResponse, handler.get_monkey, 1)
+        self.assertRaises(NoResponse, handler.get_monkey, 1)
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_breaker_not_found_is_success(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        handler = ZooServiceRequestHandler(self.zoo_service_url, breakers=CircuitBreakers(failure_threshold=1))
+
+        for _ in range(3):
+            self.assertRaises(BadResponse, handler.get_monkey, 10)
+        self.assertEqual(mock_get.call_count, 3)
+
+    @patch('zoo_keeper_server.deadline.time.monotonic')
+    @patch(REQUESTS_GET_PATCH)
+    def test_deadline_shortens_timeout_and_stops_retries(self, mock_get, mock_time):
+        def timeout_after_one_and_a_half_seconds(addr, timeout=1):
+            mock_time.return_value += 1.5
+            raise requests.exceptions.Timeout('nope')
+
+        mock_time.return_value = 100.
+        mock_get.side_effect = timeout_after_one_and_a_half_seconds
+        handler = ZooServiceRequestHandler(self.zoo_service_url, deadline=Deadline(2.5))
+
+        with self.assertRaises(NoResponse) as cm:
+            handler.get_zoo(1)
+        expected_calls = [
+            call('http://localhost:8080/zoos/1', timeout=2),
+            call('http://localhost:8080/zoos/1', timeout=1.),
+        ]
+        self.assertEqual(mock_get.call_args_list, expected_calls)
+        expected = {
+            'error': 504,
+            'title': 'gateway timeout',
+            'error_type': 'NoResponse',
+            'text': 'at address: http://localhost:8080/zoos/1, attempts: 2, deadline of 2.5 seconds exceeded'
+        }
+        self.assertEqual(json.loads(cm.exception.args[0]), expected)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_expired_deadline_is_not_a_breaker_failure(self, mock_get):
+        mock_get.side_effect = MockRequests.get
+        breakers = CircuitBreakers(failure_threshold=1)
+        handler = ZooServiceRequestHandler(self.zoo_service_url, breakers=breakers, deadline=Deadline(0))
+
+        for _ in range(3):
+            self.assertRaises(NotSent, handler.get_zoo, 1)
+        mock_get.assert_not_called()
+        self.assertEqual(breakers.get(handler.zoo_addr).state, CLOSED)
+
+        handler = ZooServiceRequestHandler(self.zoo_service_url, breakers=breakers)
+        self.assertEqual(handler.get_zoo(1), MockRequests.zoo_json(1))
+
+    @patch('zoo_keeper_server.zoo_service_request_handler.time.sleep')
+    @patch('zoo_keeper_server.retry_policy.random.uniform')
+    @patch(REQUESTS_GET_PATCH)
+    def test_retry_policy_backs_off_between_attempts(self, mock_get, mock_uniform, mock_sleep):
+        mock_get.side_effect = requests.exceptions.Timeout('nope')
+        mock_uniform.side_effect = lambda low, high: high
+        retry_policy = RetryPolicy(base_delay=0.1, max_delay=1.)
+        handler = ZooServiceRequestHandler(self.zoo_service_url, retry_policy=retry_policy)
+
+        self.assertRaises(NoResponse, handler.get_zoo, 1)
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(mock_sleep.call_args_list, [call(0.1), call(0.2)])
+        expected = {handler.zoo_addr: {'requests': 1, 'retries': 2, 'budget_exhausted': 0}}
+        self.assertEqual(retry_policy.stats(), expected)
+
+    @patch('zoo_keeper_server.zoo_service_request_handler.time.sleep')
+    @patch(REQUESTS_GET_PATCH)
+    def test_retry_policy_budget_stops_retries(self, mock_get, mock_sleep):
+        mock_get.side_effect = requests.exceptions.Timeout('nope')
+        retry_policy = RetryPolicy(budget_ratio=0., retry_reserve=3)
+        handler = ZooServiceRequestHandler(self.zoo_service_url, retry_policy=retry_policy)
+
+        self.assertRaises(NoResponse, handler.get_zoo, 1)
+        self.assertEqual(mock_get.call_count, 3)
+
+        with self.assertRaises(NoResponse) as cm:
+            handler.get_monkey(1)
+        self.assertEqual(mock_get.call_count, 5)
+        self.assertEqual(
+            json.loads(cm.exception.args[0])['text'],
+            'at address: http://localhost:8080/monkeys/1, attempts: 2, retry budget exhausted'
+        )
+
+        self.assertRaises(NoResponse, handler.get_monkey, 1)
+        self.assertEqual(mock_get.call_count, 6)
+        self.assertEqual(mock_sleep.call_count, 3)
+        expected = {
+            handler.zoo_addr: {'requests': 1, 'retries': 2, 'budget_exhausted': 0},
+            handler.monkey_addr: {'requests': 2, 'retries': 1, 'budget_exhausted': 2},
+        }
+        self.assertEqual(retry_policy.stats(), expected)
+
+
+class TestZooServiceRevalidation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockZooServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset()
+        self.cache = LookupCache(default_ttl=0)
+        self.handler = ZooServiceRequestHandler(self.server.url, session=PooledSession(), cache=self.cache)
+
+    def tearDown(self):
+        self.handler.session.close()
+
+    def test_expired_record_is_revalidated(self):
+        self.assertEqual(self.handler.get_zoo(1), MockRequests.zoo_json(1))
+        self.assertEqual(self.cache.get_stale('zoo', 1).validators['If-Modified-Since'], self.server.last_modified)
+
+        self.assertEqual(self.handler.get_zoo(1), MockRequests.zoo_json(1))
+        self.assertTrue(self.handler.has_zoo(1))
+        self.assertEqual(self.server.requests, [('GET', '/zoos/1')] * 3)
+        self.assertEqual(self.server.not_modified, 2)
+
+    def test_changed_record_is_fetched_again(self):
+        self.handler.get_monkey(3)
+        with patch.dict(MockRequests.monkeys, {3: {'id': 3, 'zoo_id': 1}}):
+            self.assertEqual(self.handler.get_monkey(3), {'id': 3, 'zoo_id': 1})
+        self.assertEqual(self.server.not_modified, 0)
+        self.assertEqual(self.handler.get_monkey(3), {'id': 3, 'zoo_id': 2})
+
+    def test_not_found_is_not_revalidated(self):
+        self.assertRaises(BadResponse, self.handler.get_zoo, 10)
+        self.assertIsNone(self.cache.get_stale('zoo', 10))
+        self.assertRaises(BadResponse, self.handler.get_zoo, 10)
+        self.assertEqual(self.server.not_modified, 0)
+
+
+class TestZooServiceDeadline(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockZooServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset()
+        self.session = PooledSession()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_short_deadline_is_not_a_breaker_failure(self):
+        self.server.delay = 0.05
+        breakers = CircuitBreakers(failure_threshold=1)
+        retry_policy = RetryPolicy(retry_reserve=1)
+        for _ in range(5):
+            handler = ZooServiceRequestHandler(self.server.url, session=self.session, breakers=breakers,
+                                               deadline=Deadline(0.01), retry_policy=retry_policy)
+            self.assertRaises(DeadlineCut, handler.get_zoo, 1)
+        self.assertEqual(breakers.get(handler.zoo_addr).state, CLOSED)
+        self.assertEqual(retry_policy.stats()[handler.zoo_addr]['retries'], 0)
+
+        handler = ZooServiceRequestHandler(self.server.url, session=self.session, breakers=breakers,
+                                           deadline=Deadline(10), retry_policy=retry_policy)
+        self.assertEqual(handler.get_zoo(1), MockRequests.zoo_json(1))
+
+
+class TestZooServiceStaleRecords(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockZooServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset()
+        self.cache = LookupCache(default_ttl=0, stale_while_revalidate=60, stale_if_error=600)
+        self.handler = ZooServiceRequestHandler(self.server.url, session=PooledSession(), cache=self.cache)
+
+    def tearDown(self):
+        self.handler.session.close()
+
+    def test_stale_record_is_served_while_refreshed(self):
+        self.handler.get_zoo(1)
+        self.server.delay = 0.5
+        start = time.monotonic()
+        self.assertEqual(self.handler.get_zoo(1), MockRequests.zoo_json(1))
+        self.assertEqual(self.handler.get_zoo(1), MockRequests.zoo_json(1))
+        self.assertLess(time.monotonic() - start, 0.4)
+
+        _wait_for(lambda: self.server.not_modified == 1)
+        self.assertEqual(self.server.requests, [('GET', '/zoos/1')] * 2)
+        self.assertEqual(self.server.not_modified, 1)
+
+    def test_stale_record_is_served_on_no_response(self):
+        self.cache.configure(stale_while_revalidate=0)
+        self.cache.set('zoo', 1, {'id': 1}, ttl=0)
+        self.cache.set('monkey', 1, {'id': 1}, ttl=-601)
+        handler = ZooServiceRequestHandler('http://127.0.0.1:1', request_attempts=1, cache=self.cache)
+
+        self.assertEqual(handler.get_zoo(1), {'id': 1, 'stale': True})
+        self.assertRaises(NoResponse, handler.get_monkey, 1)
+
+    @patch(REQUESTS_GET_PATCH)
+    def test_stale_record_is_served_on_server_error(self, mock_get):
+        mock_get.return_value = MockResponse({'error': 503}, 503)
+        self.cache.configure(stale_while_revalidate=0)
+        self.cache.set('zoo', 1, {'id': 1}, ttl=0)
+        handler = ZooServiceRequestHandler('http://localhost:8080', cache=self.cache)
+
+        self.assertEqual(handler.get_zoo(1), {'id': 1, 'stale': True})
+        self.assertRaises(BadResponse, handler.get_zoo, 2)
+
+
+class TestZooServiceCoalescing(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockZooServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.server.reset()
+        self.flights = SingleFlight()
+        self.session = PooledSession()
+
+    def tearDown(self):
+        self.session.close()
+
+    def _get_concurrently(self, handlers, method_name, record_id) -> list:
+        results = [None] * len(handlers)
+
+        def get(index):
+            try:
+                results[index] = getattr(handlers[index], method_name)(record_id)
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=get, args=(index,)) for index in range(len(handlers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def _create_handlers(self, count=5, **kwargs) -> list:
+        return [
+            ZooServiceRequestHandler(self.server.url, session=self.session, flights=self.flights, **kwargs)
+            for _ in range(count)
+        ]
+
+    def test_concurrent_lookups_share_one_request(self):
+        self.server.delay = 0.3
+        results = self._get_concurrently(self._create_handlers(), 'get_zoo', 1)
+
+        self.assertEqual(results, [MockRequests.zoo_json(1)] * 5)
+        self.assertEqual(self.server.requests, [('GET', '/zoos/1')])
+        self.assertEqual(self.flights.stats(), {'in_flight': 0, 'leaders': 1, 'coalesced': 4})
+
+    def test_concurrent_lookups_share_the_error(self):
+        self.server.delay = 0.3
+        results = self._get_concurrently(self._create_handlers(), 'get_monkey', 10)
+
+        self.assertEqual(len(self.server.requests), 1)
+        for result in results:
+            self.assertIsInstance(result, BadResponse)
+
+    def test_different_requests_are_not_coalesced(self):
+        handler = self._create_handlers(1)[0]
+        handler.get_zoo(1)
+        handler.get_zoo(1)
+        handler.has_zoo(1)
+        self.assertEqual(self.server.requests, [('GET', '/zoos/1'), ('GET', '/zoos/1'), ('HEAD', '/zoos/1')])
+        self.assertEqual(self.flights.stats()['coalesced'], 0)
+
+    def test_deadline_cut_is_not_shared(self):
+        self.server.delay = 0.2
+        leader = self._create_handlers(1, deadline=Deadline(0.05))[0]
+        thread = threading.Thread(target=self.assertRaises, args=(DeadlineCut, leader.get_zoo, 1))
+        thread.start()
+        _wait_for(lambda: self.flights.stats()['in_flight'] == 1)
+
+        follower = self._create_handlers(1, deadline=Deadline(10))[0]
+        self.assertEqual(follower.get_zoo(1), MockRequests.zoo_json(1))
+        thread.join(5)
+        self.assertEqual(self.server.requests, [('GET', '/zoos/1')] * 2)
+
+    def test_wait_is_cut_by_deadline(self):
+        self.server.delay = 0.5
+        slow_handler = self._create_handlers(1)[0]
+        thread = threading.Thread(target=slow_handler.get_zoo, args=(1,))
+        thread.start()
+        _wait_for(lambda: self.flights.stats()['in_flight'] == 1)
+
+        handler = self._create_handlers(1, deadline=Deadline(0.05))[0]
+        self.assertRaises(NoResponse, handler.get_zoo, 1)
+        thread.join(5)
+        self.assertEqual(self.server.requests, [('GET', '/zoos/1')])
+
+
+def _wait_for(condition, timeout=5.):
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            raise AssertionError('condition not met after {} seconds'.format(timeout))
+        time.sleep(0.01)
@@ -0,0 +1,70 @@
+import unittest
+from unittest.mock import patch
+
+from tests.mock_requests import MockRequests
+
+from zoo_keeper_server.zoo_service_request_handler import ZooServiceRequestHandler
+from zoo_keeper_server.zoo_service_session import PooledSession, ZooServiceSession
+
+REQUESTS_GET_PATCH = 'requests.Session.get'
+MONOTONIC_PATCH = 'zoo_keeper_server.zoo_service_session.time.monotonic'
+
+
+class TestPooledSession(unittest.TestCase):
+
+    def setUp(self):
+        self.session = PooledSession(pool_connections=2, pool_maxsize=5, idle_timeout=10)
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_defaults(self):
+        session = PooledSession()
+        self.assertEqual(session.pool_connections, 10)
+        self.assertEqual(session.pool_maxsize, 10)
+        self.assertEqual(session.idle_timeout, 60)
+
+    def test_adapter_uses_pool_sizes(self):
+        adapter = self.session._get_session().get_adapter('http://localhost:8080')
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertEqual(adapter._pool_maxsize, 5)
+
+    @patch(MONOTONIC_PATCH)
+    def test_session_reused_while_active(self, mock_time):
+        mock_time.return_value = 100.
+        first = self.session._get_session()
+        mock_time.return_value = 109.
+        second = self.session._get_session()
+        mock_time.return_value = 118.
+        third = self.session._get_session()
+        self.assertIs(first, second)
+        self.assertIs(second, third)
+
+    @patch(MONOTONIC_PATCH)
+    def test_idle_session_is_replaced(self, mock_time):
+        mock_time.return_value = 100.
+        first = self.session._get_session()
+        mock_time.return_value = 111.
+        second = self.session._get_session()
+        self.assertIsNot(first, second)
+
+    def test_configure_replaces_session(self):
+        first = self.session._get_session()
+        self.session.configure(pool_maxsize=20)
+        second = self.session._get_session()
+        self.assertIsNot(first, second)
+        self.assertEqual(self.session.pool_connections, 2)
+        self.assertEqual(self.session.pool_maxsize, 20)
+        self.assertEqual(self.session.idle_timeout, 10)
+        self.assertEqual(second.get_adapter('http://localhost:8080')._pool_maxsize, 20)
+
+    @patch(REQUESTS_GET_PATCH, MockRequests.get)
+    def test_get(self):
+        response = self.session.get('http://localhost:8080/monkeys/1', timeout=2)
+        self.assertEqual(response.json(), {'id': 1, 'zoo_id': 1})
+
+    def test_handlers_share_session(self):
+        first = ZooServiceRequestHandler('http://localhost:8080')
+        second = ZooServiceRequestHandler('http://other:8080')
+        self.assertIs(first.session, ZooServiceSession)
+        self.assertIs(second.session, ZooServiceSession)
@@ -1,6 +1,12 @@
 from flask import Flask
 
 from zoo_keeper_server.data_base_session import DataBaseSession
+from zoo_keeper_server.circuit_breaker import ZooServiceBreakers
+from zoo_keeper_server.enrichment_executor import EnrichmentExecutor
+from zoo_keeper_server.lookup_cache import ZooServiceCache, ZooKeeperCache
+from zoo_keeper_server.replica_router import DataBaseReplicas
+from zoo_keeper_server.retry_policy import ZooServiceRetryPolicy
+from zoo_keeper_server.zoo_service_session import ZooServiceSession
 
 from zoo_keeper_server import USER, DB
 
@@ -24,4 +30,49 @@ def create_app():
 
     DataBaseSession.configure(bind=app_engine)
 
+    DataBaseReplicas.configure(
+        replicas=[
+            create_engine("mysql://{}@{}/{}".format(USER, host_name, DB), encoding='latin1')
+            for host_name in app.config.get('DB_REPLICA_HOST_NAMES') or []
+        ],
+        strategy=app.config.get('DB_REPLICA_STRATEGY')
+    )
+
+    ZooServiceSession.configure(
+        pool_connections=app.config.get('ZOO_SERVICE_POOL_CONNECTIONS'),
+        pool_maxsize=max(app.config.get('ZOO_SERVICE_POOL_MAXSIZE'), app.config.get('ENRICHMENT_MAX_WORKERS')),
+        idle_timeout=app.config.get('ZOO_SERVICE_POOL_IDLE_TIMEOUT')
+    )
+
+    ZooServiceCache.configure(
+        max_entries=app.config.get('ZOO_SERVICE_CACHE_MAX_ENTRIES'),
+        ttls={
+            'zoo': app.config.get('ZOO_SERVICE_CACHE_ZOO_TTL'),
+            'monkey': app.config.get('ZOO_SERVICE_CACHE_MONKEY_TTL')
+        },
+        negative_ttl=app.config.get('ZOO_SERVICE_CACHE_NEGATIVE_TTL'),
+        stale_while_revalidate=app.config.get('ZOO_SERVICE_CACHE_STALE_WHILE_REVALIDATE'),
+        stale_if_error=app.config.get('ZOO_SERVICE_CACHE_STALE_IF_ERROR')
+    )
+
+    ZooKeeperCache.configure(
+        max_entries=app.config.get('ZOO_KEEPER_CACHE_MAX_ENTRIES'),
+        default_ttl=app.config.get('ZOO_KEEPER_CACHE_TTL')
+    )
+
+    EnrichmentExecutor.configure(max_workers=app.config.get('ENRICHMENT_MAX_WORKERS'))
+
+    ZooServiceBreakers.configure(
+        failure_threshold=app.config.get('ZOO_SERVICE_BREAKER_FAILURE_THRESHOLD'),
+        reset_timeout=app.config.get('ZOO_SERVICE_BREAKER_RESET_TIMEOUT'),
+        half_open_max_calls=app.config.get('ZOO_SERVICE_BREAKER_HALF_OPEN_MAX_CALLS')
+    )
+
+    ZooServiceRetryPolicy.configure(
+        base_delay=app.config.get('ZOO_SERVICE_RETRY_BASE_DELAY'),
+        max_delay=app.config.get('ZOO_SERVICE_RETRY_MAX_DELAY'),
+        budget_ratio=app.config.get('ZOO_SERVICE_RETRY_BUDGET_RATIO'),
+        retry_reserve=app.config.get('ZOO_SERVICE_RETRY_RESERVE')
+    )
+
     return app
@@ -0,0 +1,143 @@
+import asyncio
+import json
+
+import aiohttp
+
+from zoo_keeper_server.zoo_service_request_handler import BadResponse, NoResponse, get_no_response_json
+
+
+class AsyncResponse(object):
+    """
+    the parts of an aiohttp response kept after its connection goes back to the pool.
+    """
+    def __init__(self, status_code, body: bytes):
+        self.status_code = status_code
+        self.body = body
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.body.decode())
+
+
+def create_client_session(pool_maxsize=10, idle_timeout=60) -> aiohttp.ClientSession:
+    """
+    must be called with a running event loop.
+
+    :param pool_maxsize: maximum connections kept open per host
+    :param idle_timeout: seconds an unused connection stays open
+    """
+    connector = aiohttp.TCPConnector(limit_per_host=pool_maxsize, keepalive_timeout=idle_timeout)
+    return aiohttp.ClientSession(connector=connector)
+
+
+class AsyncZooServiceRequestHandler(object):
+    """
+    asyncio version of ZooServiceRequestHandler, with the same methods as coroutines.
+    it closes its session on close() only if it created it.
+    """
+    def __init__(self, zoo_service_url, timeout=2, request_attempts=3, session: aiohttp.ClientSession = None):
+        self.server_url = zoo_service_url
+        self.zoo_addr = '{}/zoos/'.format(self.server_url)
+        self.monkey_addr = '{}/monkeys/'.format(self.server_url)
+        self.timeout = timeout
+        self.request_attempts = request_attempts
+        self.session = session
+        self._owns_session = session is None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def handle_request(self, address, use_get=True) -> AsyncResponse:
+        if self.session is None:
+            self.session = create_client_session()
+        method = 'GET' if use_get else 'HEAD'
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        tries = 0
+        error_text = ""
+        while tries < self.request_attempts:
+            try:
+                async with self.session.request(method, address, timeout=timeout) as response:
+                    return AsyncResponse(response.status, await response.read())
+            except asyncio.TimeoutError:
+                tries += 1
+            except aiohttp.ClientError as e:
+                error_text = str(e)
+                break
+        if not error_text:
+            error_text = "at address: {}, attempts: {}, timeout after: {} seconds".format(
+                address, self.request_attempts, self.timeout
+            )
+        raise NoResponse(get_no_response_json(error_text))
+
+    async def get_all_monkeys(self) -> list:
+        request = await self.handle_request(self.monkey_addr)
+        _check_response(request)
+        return request.json()
+
+    async def get_all_zoos(self) -> list:
+        request = await self.handle_request(self.zoo_addr)
+        _check_response(request)
+        return request.json()
+
+    async def get_monkey(self, monkey_id: int) -> dict:
+        request = await self.handle_request(self.monkey_addr + str(monkey_id))
+        _check_response(request)
+        return request.json()
+
+    async def get_zoo(self, zoo_id: int) -> dict:
+        request = await self.handle_request(self.zoo_addr + str(zoo_id))
+        _check_response(request)
+        return request.json()
+
+    async def has_zoo(self, zoo_id: int) -> bool:
+        request = await self.handle_request(self.zoo_addr + str(zoo_id), use_get=False)
+        return request.ok
+
+    async def has_monkey(self, monkey_id: int) -> bool:
+        request = await self.handle_request(self.monkey_addr + str(monkey_id), use_get=False)
+        return request.ok
+
+    async def is_monkey_in_zoo(self, monkey_id: int, zoo_id: int) -> bool:
+        test_json = await self.get_monkey(monkey_id)
+        return test_json['zoo_id'] == zoo_id
+
+    async def get_zoo_service_jsons(self, lookups) -> dict:
+        """
+        gathers every (entity, id) lookup at once. errors are returned as their JSON, like in enrichment.
+
+        :param lookups: (entity, id) pairs, entity is 'zoo' or 'monkey'
+        :return: {(entity, id): json}
+        """
+        entities_to_methods = {
+            'zoo': self.get_zoo,
+            'monkey': self.get_monkey
+        }
+        lookups = list(lookups)
+        results = await asyncio.gather(*[
+            _get_zoo_service_json(entities_to_methods[entity], zoo_service_id) for entity, zoo_service_id in lookups
+        ])
+        return dict(zip(lookups, results))
+
+
+async def _get_zoo_service_json(method, zoo_service_id) -> dict:
+    try:
+        return await method(zoo_service_id)
+    except (BadResponse, NoResponse) as e:
+        return json.loads(e.args[0])
+
+
+def _check_response(request: AsyncResponse):
+    if not request.ok:
+        raise BadResponse(json.dumps(request.json()))
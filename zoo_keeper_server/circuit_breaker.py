@@ -0,0 +1,135 @@
+"""
+NOTE: ZooServiceBreakers is shared by every ZooServiceRequestHandler given breakers=ZooServiceBreakers.
+Thresholds are set with ZooServiceBreakers.configure(...) before serving requests.
+"""
+
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker(object):
+    """
+    closed: requests pass. failure_threshold failures in a row open the breaker.
+    open: requests are rejected until reset_timeout seconds have passed, then it is half open.
+    half_open: up to half_open_max_calls trial requests pass. a success closes the breaker, a failure opens it.
+
+    :param failure_threshold: consecutive failures that open a closed breaker
+    :param reset_timeout: seconds an open breaker rejects requests before trying again
+    :param half_open_max_calls: trial requests allowed at once while half open
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30, half_open_max_calls=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state_changes = {CLOSED: 0, OPEN: 0, HALF_OPEN: 0}
+        self.rejected = 0
+
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            self._update_state()
+            return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            self._update_state()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self):
+        """
+        gives back the trial slot allow_request took for a request that was not sent.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self._state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            if self._state == OPEN:
+                return
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._update_state()
+            stats = {'state': self._state, 'rejected': self.rejected}
+            stats.update(self.state_changes)
+            return stats
+
+    def _update_state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+
+    def _set_state(self, state):
+        self._state = state
+        self._half_open_calls = 0
+        self.state_changes[state] += 1
+
+
+class CircuitBreakers(object):
+    """
+    one CircuitBreaker per endpoint family, created on first use with the current settings.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30, half_open_max_calls=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def configure(self, failure_threshold=None, reset_timeout=None, half_open_max_calls=None):
+        with self._lock:
+            if failure_threshold is not None:
+                self.failure_threshold = failure_threshold
+            if reset_timeout is not None:
+                self.reset_timeout = reset_timeout
+            if half_open_max_calls is not None:
+                self.half_open_max_calls = half_open_max_calls
+            self._breakers.clear()
+
+    def get(self, family) -> CircuitBreaker:
+        with self._lock:
+            if family not in self._breakers:
+                self._breakers[family] = CircuitBreaker(
+                    self.failure_threshold, self.reset_timeout, self.half_open_max_calls
+                )
+            return self._breakers[family]
+
+    def clear(self):
+        with self._lock:
+            self._breakers.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {family: breaker.stats() for family, breaker in breakers.items()}
+
+
+ZooServiceBreakers = CircuitBreakers()
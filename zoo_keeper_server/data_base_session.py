@@ -6,14 +6,21 @@ from contextlib import contextmanager
 
 from sqlalchemy.orm import sessionmaker
 
+from zoo_keeper_server.replica_router import DataBaseReplicas
+
 DataBaseSession = sessionmaker()
 
 
 @contextmanager
-def data_base_session_scope():
-    session = DataBaseSession()
+def data_base_session_scope(read_only=False):
+    """
+    :param read_only: bind the session to a replica from DataBaseReplicas, if there are any
+    """
+    replica = DataBaseReplicas.acquire() if read_only else None
+    session = DataBaseSession() if replica is None else DataBaseSession(bind=replica)
     try:
         yield session
     finally:
         session.close()
-
+        if replica is not None:
+            DataBaseReplicas.release(replica)
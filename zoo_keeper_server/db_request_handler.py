@@ -1,10 +1,33 @@
+import hashlib
 import json
+from concurrent.futures import wait
+from urllib.parse import urlencode
 
-from zoo_keeper_server.zoo_keeper import ZooKeeper
-from zoo_keeper_server.zoo_service_request_handler import ZooServiceRequestHandler, NoResponse, BadResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+
+from zoo_keeper_server.deadline import Deadline
+from zoo_keeper_server.enrichment_executor import EnrichmentExecutor, SharedExecutor
+from zoo_keeper_server.lookup_cache import LookupCache, NotFound
+from zoo_keeper_server.zoo_keeper import ZooKeeper, ZOO_KEEPER_COLUMNS
+from zoo_keeper_server.zoo_service_request_handler import (
+    ZooServiceRequestHandler, NoResponse, BadResponse, get_no_response_json
+)
 from zoo_keeper_server.data_base_session import DataBaseSession
 
 
+ZOO_KEEPER_LOCATION = '/zoo_keepers/{}'
+ZOO_KEEPER_ENTITY = 'zoo_keeper'
+
+ZOO_KEEPER_FILTERS = ('zoo_id', 'favorite_monkey_id', 'dream_monkey_id', 'min_age', 'max_age', 'name_prefix')
+
+KEYS_TO_ENTITIES = {
+    'zoo': 'zoo',
+    'dream_monkey': 'monkey',
+    'favorite_monkey': 'monkey'
+}
+
+
 class BadId(ValueError):
     pass
 
@@ -13,9 +36,26 @@ class BadData(ValueError):
     pass
 
 
+class StaleVersion(ValueError):
+    pass
+
+
 class DBRequestHandler(object):
-    def __init__(self, zoo_service: ZooServiceRequestHandler):
+    def __init__(self, zoo_service: ZooServiceRequestHandler, executor: SharedExecutor = EnrichmentExecutor,
+                 bulk_threshold=50,
+                 deadline: Deadline = None, page_size=100, max_page_size=1000, stream_chunk_size=100,
+                 insert_batch_size=500, return_minimal=False, response_cache: LookupCache = None):
         self.zoo_service_rh = zoo_service
+        self.executor = executor
+        self.bulk_threshold = bulk_threshold
+        self.deadline = deadline
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.stream_chunk_size = stream_chunk_size
+        self.insert_batch_size = insert_batch_size
+        self.return_minimal = return_minimal
+        self.response_cache = response_cache
+        self._committed = False
         self.zoo_keeper_keys = {
             "name", "age", "zoo_id", "favorite_monkey_id", "dream_monkey_id"
         }
@@ -40,55 +80,497 @@ class DBRequestHandler(object):
 
         return json.dumps(response), response_code
 
-    def get_all_zoo_keepers(self, session: DataBaseSession):
-        zoo_keepers = session.query(ZooKeeper).all()
-        all_jsons = [self._get_zoo_keeper_json(zoo_keeper) for zoo_keeper in zoo_keepers]
-        return json.dumps(all_jsons), 200
+    def get_all_zoo_keepers(self, session: DataBaseSession, after=None, limit=None, fields=None, expand=None,
+                            filters: dict = None, if_none_match=None):
+        """
+        one page of zoo keepers in id order, with ids greater than after. when there are more,
+        a Link header holds the query for the next page.
 
-    def get_zoo_keeper(self, session: DataBaseSession, zoo_keeper_id):
-        zoo_keeper = session.query(ZooKeeper).filter(ZooKeeper.id == zoo_keeper_id).first()
+        :param after: id of the last zoo keeper on the previous page
+        :param limit: page size, default page_size, at most max_page_size
+        :param fields: see _get_projection
+        :param expand: see _get_projection
+        :param filters: see _filter
+        :param if_none_match: see _get_conditional_response
+        :raise: BadData
+        """
+        after, limit = self._get_page_args(after, limit)
+        columns, relations = self._get_projection(fields, expand)
+        query = self._query(session, 'get all zoo keepers', columns, relations)
+        query = _filter(query, filters).order_by(ZooKeeper.id)
+        if after is not None:
+            query = query.filter(ZooKeeper.id > after)
+        zoo_keepers = query.limit(limit + 1).all()
+
+        headers = {}
+        if len(zoo_keepers) > limit:
+            zoo_keepers = zoo_keepers[:limit]
+            next_args = {'after': zoo_keepers[-1].id, 'limit': limit, 'fields': fields, 'expand': expand}
+            next_args.update(filters or {})
+            query_string = urlencode([(key, value) for key, value in next_args.items() if value is not None])
+            headers['Link'] = '<?{}>; rel="next"'.format(query_string)
+        entries = self._get_zoo_keeper_entries(zoo_keepers, columns, relations)
+        body = '[{}]'.format(', '.join(entry[1] for entry in entries))
+        etag = _get_etag(' '.join([entry[2] for entry in entries] + [headers.get('Link', '')]))
+        return _get_conditional_response(body, etag, if_none_match, headers)
+
+    def stream_zoo_keepers(self, session: DataBaseSession, ndjson=False, after=None, fields=None, expand=None,
+                           filters: dict = None):
+        """
+        yields every zoo keeper with id greater than after, in id order, reading and enriching
+        stream_chunk_size rows at a time. each chunk is yielded as soon as it is enriched.
+        the first chunk is yielded only once the query has run, and is yielded even if there are no rows.
+        a stream can outlast the deadline, so the query gets no execution time limit and each chunk's
+        enrichment gets a deadline of its own, with the budget of the request deadline.
+
+        :param ndjson: yield one JSON object per line instead of the text of one JSON array
+        :raise: BadData
+        """
+        after, _ = self._get_page_args(after, None)
+        columns, relations = self._get_projection(fields, expand)
+        query = self._query(session, 'stream zoo keepers', columns, relations, limit_execution_time=False)
+        query = _filter(query, filters).order_by(ZooKeeper.id)
+        if after is not None:
+            query = query.filter(ZooKeeper.id > after)
+        query = query.execution_options(stream_results=True).yield_per(self.stream_chunk_size)
+
+        is_first = True
+        for zoo_keepers in _get_chunks(query, self.stream_chunk_size):
+            self._restart_deadline()
+            zoo_keeper_jsons = self._get_zoo_keeper_jsons(zoo_keepers, columns, relations)
+            dumped = [json.dumps(zoo_keeper_json) for zoo_keeper_json in zoo_keeper_jsons]
+            if ndjson:
+                yield ''.join(zoo_keeper_json + '\n' for zoo_keeper_json in dumped)
+            else:
+                yield ('[' if is_first else ', ') + ', '.join(dumped)
+            is_first = False
+        if is_first:
+            yield '' if ndjson else '[]'
+        elif not ndjson:
+            yield ']'
+
+    def _get_page_args(self, after, limit) -> tuple:
+        try:
+            after = None if after is None else int(after)
+            limit = self.page_size if limit is None else int(limit)
+        except ValueError:
+            raise BadData("after and limit must be integers. after: {}, limit: {}".format(after, limit))
+        if limit < 1:
+            raise BadData("limit must be at least 1. limit: {}".format(limit))
+        return after, min(limit, self.max_page_size)
+
+    def get_zoo_keepers_by_ids(self, session: DataBaseSession, ids, fields=None, expand=None):
+        """
+        selects all ids with one IN query and enriches them together, so each zoo and monkey is fetched once.
+
+        :param ids: comma separated ids, at most max_page_size of them
+        :param fields: see _get_projection
+        :param expand: see _get_projection
+        :raise: BadData
+        :return: JSON {"zoo_keepers": [...], "missing": [...]}, both in the order of ids
+        """
+        ids = list(dict.fromkeys(_get_ids(_split_names(ids))))
+        if len(ids) > self.max_page_size:
+            raise BadData("at most {} ids at once, got: {}".format(self.max_page_size, len(ids)))
+        columns, relations = self._get_projection(fields, expand)
+        query = self._query(session, 'get zoo keepers by ids', columns, relations)
+        zoo_keepers_by_id = {zoo_keeper.id: zoo_keeper for zoo_keeper in query.filter(ZooKeeper.id.in_(ids))}
+
+        zoo_keepers = [zoo_keepers_by_id[zoo_keeper_id] for zoo_keeper_id in ids if zoo_keeper_id in zoo_keepers_by_id]
+        output = {
+            'zoo_keepers': self._get_zoo_keeper_jsons(zoo_keepers, columns, relations),
+            'missing': [zoo_keeper_id for zoo_keeper_id in ids if zoo_keeper_id not in zoo_keepers_by_id]
+        }
+        return json.dumps(output), 200
+
+    def _get_projection(self, fields, expand) -> tuple:
+        """
+        :param fields: comma separated columns and relations to return. default: all columns, and all
+                       relations unless expand is given. id is always returned.
+        :param expand: comma separated relations to fetch from the zoo service, besides those in fields
+        :raise: BadData
+        :return: (columns, relations)
+        """
+        all_relations = tuple(KEYS_TO_ENTITIES)
+        names = list(ZOO_KEEPER_COLUMNS) if fields is None else _split_names(fields)
+        if fields is None and expand is None:
+            names.extend(all_relations)
+        expand_names = [] if expand is None else _split_names(expand)
+
+        unknown_fields = set(names) - set(ZOO_KEEPER_COLUMNS) - set(all_relations)
+        unknown_relations = set(expand_names) - set(all_relations)
+        if unknown_fields or unknown_relations:
+            msg = "unknown fields: {}, unknown relations: {}. columns: {}. relations: {}"
+            msg = msg.format(unknown_fields, unknown_relations, ZOO_KEEPER_COLUMNS, all_relations)
+            raise BadData(msg)
+
+        names.extend(expand_names)
+        columns = tuple(column for column in ZOO_KEEPER_COLUMNS if column == 'id' or column in names)
+        relations = tuple(relation for relation in all_relations if relation in names)
+        return columns, relations
+
+    def get_zoo_keeper(self, session: DataBaseSession, zoo_keeper_id, fields=None, expand=None, if_none_match=None):
+        """
+        :param fields: see _get_projection
+        :param expand: see _get_projection
+        :param if_none_match: see _get_conditional_response
+        :raise: BadData, BadId
+        """
+        columns, relations = self._get_projection(fields, expand)
+        query = self._query(session, 'get zoo keeper', columns, relations)
+        zoo_keeper = query.filter(ZooKeeper.id == zoo_keeper_id).first()
         _raise_bad_id_for_none_value(zoo_keeper, zoo_keeper_id)
-        zoo_keeper_json = self._get_zoo_keeper_json(zoo_keeper)
-        return json.dumps(zoo_keeper_json), 200
+        _, body, etag = self._get_zoo_keeper_entries([zoo_keeper], columns, relations)[0]
+        return _get_conditional_response(body, etag, if_none_match, {})
+
+    def _query(self, session: DataBaseSession, action, columns=None, relations=(), limit_execution_time=True):
+        """
+        :param columns: if given, select only these columns and the ids of relations, as rows instead of ZooKeepers
+        :param limit_execution_time: False to only check the deadline before the query, not stop it at the deadline
+        once a write is committed, queries reading it back are not cut by the deadline,
+        so a write that succeeded is not reported as timed out.
+
+        :raise: DeadlineExceeded
+        :return: a ZooKeeper query that MySQL stops once the deadline passes
+        """
+        if columns is None:
+            query = session.query(ZooKeeper)
+        else:
+            selected = set(columns) | {relation + '_id' for relation in relations} | {'version'}
+            selected_columns = [column for column in ZOO_KEEPER_COLUMNS + ('version',) if column in selected]
+            query = session.query(*[getattr(ZooKeeper, column) for column in selected_columns])
+        if self.deadline is not None and not self._committed:
+            self.deadline.raise_if_expired(action)
+            if limit_execution_time:
+                milliseconds = max(1, int(self.deadline.remaining() * 1000))
+                query = query.prefix_with('/*+ MAX_EXECUTION_TIME({}) */'.format(milliseconds))
+        return query
+
+    def _restart_deadline(self):
+        """
+        replaces the deadline, and the zoo service's if it is the same one, with a new one of the same budget.
+        """
+        if self.deadline is None:
+            return
+        deadline = Deadline(self.deadline.budget)
+        if self.zoo_service_rh.deadline is self.deadline:
+            self.zoo_service_rh.deadline = deadline
+        self.deadline = deadline
+
+    def _raise_if_deadline_expired(self, action):
+        if self.deadline is not None:
+            self.deadline.raise_if_expired(action)
+
+    def _get_remaining_time(self):
+        if self.deadline is None:
+            return None
+        return self.deadline.remaining()
 
-    def _get_zoo_keeper_json(self, zoo_keeper: ZooKeeper) -> dict:
-        output_json = zoo_keeper.to_dict()
-        keys_to_methods = {
+    def _get_zoo_keeper_jsons(self, zoo_keepers: list, columns=ZOO_KEEPER_COLUMNS,
+                              relations=tuple(KEYS_TO_ENTITIES)) -> list:
+        return [entry[0] for entry in self._get_zoo_keeper_entries(zoo_keepers, columns, relations)]
+
+    def _get_zoo_keeper_entries(self, zoo_keepers: list, columns=ZOO_KEEPER_COLUMNS,
+                                relations=tuple(KEYS_TO_ENTITIES)) -> list:
+        """
+        with a response_cache, fully enriched zoo keepers are taken from it while their version is unchanged,
+        and only the others are enriched. those enriched without zoo service errors or stale records are cached.
+
+        :return: (json, serialized json, etag) for each zoo keeper
+        """
+        use_cache = self.response_cache is not None
+        use_cache = use_cache and columns == ZOO_KEEPER_COLUMNS and relations == tuple(KEYS_TO_ENTITIES)
+
+        entries = {}
+        for zoo_keeper in zoo_keepers:
+            cached = self.response_cache.get(ZOO_KEEPER_ENTITY, zoo_keeper.id) if use_cache else None
+            if cached is not None and cached[0] == zoo_keeper.version:
+                entries[zoo_keeper.id] = cached[1:]
+
+        misses = [zoo_keeper for zoo_keeper in zoo_keepers if zoo_keeper.id not in entries]
+        zoo_service_jsons = self._get_zoo_service_jsons(misses, relations)
+        zoo_keeper_jsons = _assemble_zoo_keeper_jsons(misses, zoo_service_jsons, columns, relations)
+        for zoo_keeper, zoo_keeper_json in zip(misses, zoo_keeper_jsons):
+            body = json.dumps(zoo_keeper_json)
+            entry = (zoo_keeper_json, body, _get_etag(body, zoo_keeper.version))
+            if use_cache and _is_cacheable(zoo_keeper_json):
+                self.response_cache.set(ZOO_KEEPER_ENTITY, zoo_keeper.id, (zoo_keeper.version,) + entry)
+            entries[zoo_keeper.id] = entry
+        return [entries[zoo_keeper.id] for zoo_keeper in zoo_keepers]
+
+    def _invalidate(self, zoo_keeper_ids):
+        if self.response_cache is not None:
+            for zoo_keeper_id in zoo_keeper_ids:
+                self.response_cache.invalidate(ZOO_KEEPER_ENTITY, zoo_keeper_id)
+
+    def _get_zoo_service_jsons(self, zoo_keepers: list, relations=tuple(KEYS_TO_ENTITIES)) -> dict:
+        """
+        fetches every unique zoo and monkey referenced by zoo_keepers once, on executor, unless the zoo
+        service's cache has it. from bulk_threshold lookups missing from the cache on, the catalogs of their
+        entities are fetched from /zoos/ and /monkeys/, and only ids missing from them are fetched one by one.
+        lookups unfinished at the deadline get 504 JSON.
+
+        :return: {(entity, id): json}
+        """
+        entities_to_methods = {
             'zoo': self.zoo_service_rh.get_zoo,
-            'dream_monkey': self.zoo_service_rh.get_monkey,
-            'favorite_monkey': self.zoo_service_rh.get_monkey
+            'monkey': self.zoo_service_rh.get_monkey
         }
-        for key, method in keys_to_methods.items():
-            zoo_service_id = getattr(zoo_keeper, key + '_id')
-            if zoo_service_id is None:
-                json_data = {}
+        lookups = _get_unique_lookups(zoo_keepers, relations)
+        if not lookups:
+            return {}
+        zoo_service_jsons = self._get_cached_jsons(lookups)
+        missing = [lookup for lookup in lookups if lookup not in zoo_service_jsons]
+        if self.bulk_threshold is not None and len(missing) >= self.bulk_threshold:
+            zoo_service_jsons.update(self._get_catalog_index({entity for entity, _ in missing}))
+
+        futures = {
+            (entity, zoo_service_id): self.executor.submit(
+                _get_zoo_service_json, entities_to_methods[entity], zoo_service_id
+            )
+            for entity, zoo_service_id in lookups if (entity, zoo_service_id) not in zoo_service_jsons
+        }
+        done, _ = wait(futures.values(), timeout=self._get_remaining_time())
+        for lookup, future in futures.items():
+            if future in done:
+                zoo_service_jsons[lookup] = future.result()
             else:
-                try:
-                    json_data = method(zoo_service_id)
-                except (BadResponse, NoResponse) as e:
-                    json_data = json.loads(e.args[0])
-            output_json[key] = json_data
-        return output_json
+                future.cancel()
+                zoo_service_jsons[lookup] = self._get_deadline_json(*lookup)
+        return zoo_service_jsons
+
+    def _get_cached_jsons(self, lookups) -> dict:
+        """
+        :return: {(entity, id): json} for the lookups the zoo service's cache has fresh, 404s as their error JSON
+        """
+        cache = self.zoo_service_rh.cache
+        if cache is None:
+            return {}
+        zoo_service_jsons = {}
+        for entity, zoo_service_id in lookups:
+            cached = cache.peek(entity, zoo_service_id)
+            if isinstance(cached, NotFound):
+                zoo_service_jsons[(entity, zoo_service_id)] = json.loads(cached.error_text)
+            elif cached is not None:
+                zoo_service_jsons[(entity, zoo_service_id)] = cached
+        return zoo_service_jsons
+
+    def _get_catalog_index(self, entities) -> dict:
+        """
+        :param entities: which of 'zoo' and 'monkey' to fetch the catalog of
+        :return: {(entity, id): json} for every zoo and monkey the bulk endpoints returned.
+        """
+        entities_to_methods = {
+            'zoo': self.zoo_service_rh.get_all_zoos,
+            'monkey': self.zoo_service_rh.get_all_monkeys
+        }
+        futures = {entity: self.executor.submit(_get_catalog, entities_to_methods[entity]) for entity in entities}
+        done, _ = wait(futures.values(), timeout=self._get_remaining_time())
+        index = {}
+        for entity, future in futures.items():
+            if future not in done:
+                continue
+            for zoo_service_json in future.result():
+                index[(entity, zoo_service_json['id'])] = zoo_service_json
+        return index
+
+    def _get_deadline_json(self, entity, zoo_service_id) -> dict:
+        entities_to_addresses = {
+            'zoo': self.zoo_service_rh.zoo_addr,
+            'monkey': self.zoo_service_rh.monkey_addr
+        }
+        error_text = "at address: {}{}, deadline of {} seconds exceeded".format(
+            entities_to_addresses[entity], zoo_service_id, self.deadline.budget
+        )
+        return json.loads(get_no_response_json(error_text))
 
     def post_zoo_keeper(self, session: DataBaseSession, json_data):
         self._raise_bad_data_post(json_data)
         kwargs = _convert_json(json_data)
         new_zoo_keeper = ZooKeeper(**kwargs)
+        self._raise_if_deadline_expired('post zoo keeper')
         session.add(new_zoo_keeper)
+        if self.return_minimal:
+            session.flush()
+            zoo_keeper_json = new_zoo_keeper.to_dict()
+            session.commit()
+            self._committed = True
+            self._invalidate([zoo_keeper_json['id']])
+            return json.dumps(zoo_keeper_json), 201, _get_location_header(zoo_keeper_json['id'])
         session.commit()
+        self._committed = True
+        self._invalidate([new_zoo_keeper.id])
         return self.get_zoo_keeper(session, new_zoo_keeper.id)
 
-    def put_zoo_keeper(self, session: DataBaseSession, zoo_keeper_id, json_data):
+    def post_zoo_keepers(self, session: DataBaseSession, json_datas: list, enrich=False):
+        """
+        inserts every valid json with batched executemany in one transaction. a json is rejected if
+        _raise_bad_data_post or _raise_bad_values rejects it, or its name is already taken, in the DB or
+        by an earlier json.
+        names are compared like the DB compares them, see _get_name_key.
+
+        :param enrich: add zoo and monkeys to created zoo keepers, like get_zoo_keeper
+        :raise: BadData if an insert still fails, in which case nothing is inserted
+        :return: JSON {"created": n, "failed": n, "results": [...]}, one result per json, in order
+        """
+        errors = {}
+        indexes = {}
+        for index, json_data in enumerate(json_datas):
+            try:
+                self._raise_bad_data_post(json_data)
+                _raise_bad_values(_convert_json(json_data))
+            except BadData as e:
+                errors[index] = e.args[0]
+                continue
+            name = str(_convert_value(json_data['name']))
+            if _get_name_key(name) in indexes:
+                errors[index] = 'name: "{}" is repeated in this request'.format(name)
+            else:
+                indexes[_get_name_key(name)] = index
+
+        names = [str(_convert_value(json_datas[index]['name'])) for index in indexes.values()]
+        for zoo_keeper in self._get_zoo_keepers_by_name(session, names, 'check zoo keeper names'):
+            index = indexes.pop(_get_name_key(zoo_keeper.name), None)
+            if index is not None:
+                errors[index] = 'name: "{}" already exists'.format(zoo_keeper.name)
+
+        rows = [_get_insert_row(_convert_json(json_datas[index])) for index in indexes.values()]
+        self._raise_if_deadline_expired('post zoo keepers')
+        try:
+            for batch in _get_chunks(rows, self.insert_batch_size):
+                session.execute(ZooKeeper.__table__.insert(), batch)
+            session.commit()
+        except IntegrityError as e:
+            session.rollback()
+            raise BadData("nothing was inserted: {}".format(e.orig))
+        self._committed = True
+
+        names = [str(_convert_value(json_datas[index]['name'])) for index in indexes.values()]
+        created = self._get_zoo_keepers_by_name(session, names, 'get posted zoo keepers')
+        if enrich:
+            zoo_keeper_jsons = self._get_zoo_keeper_jsons(created)
+        else:
+            zoo_keeper_jsons = [zoo_keeper.to_dict() for zoo_keeper in created]
+        created_jsons = {
+            indexes[_get_name_key(zoo_keeper_json['name'])]: zoo_keeper_json for zoo_keeper_json in zoo_keeper_jsons
+        }
+
+        results = []
+        for index in range(len(json_datas)):
+            if index in errors:
+                results.append({'index': index, 'status': 400, 'error': errors[index]})
+            else:
+                results.append({'index': index, 'status': 201, 'zoo_keeper': created_jsons[index]})
+        output = {'created': len(created_jsons), 'failed': len(errors), 'results': results}
+        return json.dumps(output), 200
+
+    def _get_zoo_keepers_by_name(self, session: DataBaseSession, names: list, action) -> list:
+        zoo_keepers = []
+        for batch in _get_chunks(names, self.insert_batch_size):
+            zoo_keepers.extend(self._query(session, action).filter(ZooKeeper.name.in_(batch)))
+        return zoo_keepers
+
+    def put_zoo_keeper(self, session: DataBaseSession, zoo_keeper_id, json_data, if_match=None):
+        """
+        :param if_match: see _raise_for_stale_version
+        :raise: BadData, BadId, StaleVersion
+        """
         self._raise_bad_data_put(json_data)
-        zoo_keeper = session.query(ZooKeeper).filter(ZooKeeper.id == zoo_keeper_id).first()  # type: ZooKeeper
+        query = self._query(session, 'put zoo keeper')
+        zoo_keeper = query.filter(ZooKeeper.id == zoo_keeper_id).first()  # type: ZooKeeper
         _raise_bad_id_for_none_value(zoo_keeper, zoo_keeper_id)
+        _raise_for_stale_version(zoo_keeper, if_match)
         kwargs = _convert_json(json_data)
         zoo_keeper.set_attributes(**kwargs)
 
-        session.commit()
+        _commit_versioned(session, zoo_keeper_id)
+        self._committed = True
+        self._invalidate([zoo_keeper.id])
+        if self.return_minimal:
+            return '', 204, _get_location_header(zoo_keeper_id)
         return self.get_zoo_keeper(session, zoo_keeper.id)
 
+    def patch_zoo_keepers(self, session: DataBaseSession, json_data):
+        """
+        sets the same values on every zoo keeper selected by json_data, see _get_bulk_queries.
+        the values are checked like posted ones, see _raise_bad_values.
+
+        :param json_data: {"ids": [...], "set": {...}} or {"filter": {...}, "set": {...}}
+        :raise: BadData
+        :return: JSON {"updated": n, "ids": [...]}, plus "missing": [...] when selected by ids
+        """
+        if not isinstance(json_data, dict) or not json_data.get('set'):
+            raise BadData("json must have a non empty set: {}".format(json_data))
+        self._raise_bad_data_put(json_data['set'])
+        values = _convert_json(json_data['set'])
+        _raise_bad_values(values, partial=True)
+        values['version'] = ZooKeeper.version + 1
+        return self._change_zoo_keepers(
+            session, json_data, 'updated', lambda query: query.update(values, synchronize_session=False)
+        )
+
+    def delete_zoo_keepers(self, session: DataBaseSession, json_data):
+        """
+        :param json_data: {"ids": [...]} or {"filter": {...}}, see _get_bulk_queries
+        :raise: BadData
+        :return: JSON {"deleted": n, "ids": [...]}, plus "missing": [...] when selected by ids
+        """
+        return self._change_zoo_keepers(
+            session, json_data, 'deleted', lambda query: query.delete(synchronize_session=False)
+        )
+
+    def _change_zoo_keepers(self, session: DataBaseSession, json_data, result_key, change):
+        """
+        runs change on each query from _get_bulk_queries, all in one transaction.
+        the selected rows are locked while their ids are read, so the ids are the rows changed.
+        """
+        queries = self._get_bulk_queries(session, json_data, '{} zoo keepers'.format(result_key))
+        ids = []
+        count = 0
+        try:
+            for query in queries:
+                ids.extend(zoo_keeper_id for zoo_keeper_id, in query.with_entities(ZooKeeper.id).with_for_update())
+                count += change(query)
+            session.commit()
+        except IntegrityError as e:
+            session.rollback()
+            raise BadData("nothing was {}: {}".format(result_key, e.orig))
+        self._invalidate(ids)
+
+        output = {result_key: count, 'ids': sorted(ids)}
+        if 'ids' in json_data:
+            output['missing'] = sorted(set(_get_ids(json_data['ids'])) - set(ids))
+        return json.dumps(output), 200
+
+    def _get_bulk_queries(self, session: DataBaseSession, json_data, action) -> list:
+        """
+        json_data selects zoo keepers by exactly one of:
+            "ids": a list of ids, queried insert_batch_size at a time
+            "filter": a non empty {key: value} that must all match, a null value matches null
+
+        :raise: BadData
+        """
+        if not isinstance(json_data, dict) or len({'ids', 'filter'} & set(json_data.keys())) != 1:
+            raise BadData("json must have exactly one of ids or filter: {}".format(json_data))
+        if 'ids' in json_data:
+            ids = _get_ids(json_data['ids'])
+            return [
+                self._query(session, action).filter(ZooKeeper.id.in_(batch))
+                for batch in _get_chunks(ids, self.insert_batch_size)
+            ]
+
+        filter_json = json_data['filter']
+        if not isinstance(filter_json, dict) or not filter_json:
+            raise BadData("filter must be a non empty JSON object: {}".format(filter_json))
+        self._raise_bad_data_put(filter_json)
+        query = self._query(session, action)
+        for key, value in _convert_json(filter_json).items():
+            query = query.filter(getattr(ZooKeeper, key) == value)
+        return [query]
+
     def _raise_bad_data_post(self, json_data):
+        if not isinstance(json_data, dict):
+            raise BadData("each zoo keeper must be a JSON object: {}".format(json_data))
         json_data_keys = set(json_data.keys())
         if not self.minimum_zoo_keeper_keys <= json_data_keys <= self.zoo_keeper_keys:
             msg = "json keys: {}. minimum keys: {}. maximum keys: {}"
@@ -101,12 +583,89 @@ class DBRequestHandler(object):
             msg = "json keys: {} must be subset of {}".format(json_data_keys, self.zoo_keeper_keys)
             raise BadData(msg)
 
-    def delete_zoo_keeper(self, session, zoo_keeper_id):
-        zoo_keeper = session.query(ZooKeeper).filter(ZooKeeper.id == zoo_keeper_id).first()
+    def delete_zoo_keeper(self, session, zoo_keeper_id, if_match=None):
+        """
+        :param if_match: see _raise_for_stale_version
+        :raise: BadId, StaleVersion
+        """
+        zoo_keeper = self._query(session, 'delete zoo keeper').filter(ZooKeeper.id == zoo_keeper_id).first()
         _raise_bad_id_for_none_value(zoo_keeper, zoo_keeper_id)
+        _raise_for_stale_version(zoo_keeper, if_match)
+        deleted_id = zoo_keeper.id
         session.delete(zoo_keeper)
-        session.commit()
-        return self.get_all_zoo_keepers(session)
+        _commit_versioned(session, zoo_keeper_id)
+        self._committed = True
+        self._invalidate([deleted_id])
+        if self.return_minimal:
+            return '', 204
+        body, code, headers = self.get_all_zoo_keepers(session)
+        headers.pop('ETag')
+        return body, code, headers
+
+
+async def get_zoo_keeper_jsons_async(zoo_keepers: list, zoo_service) -> list:
+    """
+    enriches zoo_keepers like DBRequestHandler, gathering all their lookups at once.
+
+    :param zoo_service: an AsyncZooServiceRequestHandler
+    """
+    zoo_service_jsons = await zoo_service.get_zoo_service_jsons(_get_unique_lookups(zoo_keepers))
+    return _assemble_zoo_keeper_jsons(zoo_keepers, zoo_service_jsons)
+
+
+def _assemble_zoo_keeper_jsons(zoo_keepers: list, zoo_service_jsons: dict, columns=ZOO_KEEPER_COLUMNS,
+                               relations=tuple(KEYS_TO_ENTITIES)) -> list:
+    output_jsons = []
+    for zoo_keeper in zoo_keepers:
+        output_json = {column: getattr(zoo_keeper, column) for column in columns}
+        for key in relations:
+            entity = KEYS_TO_ENTITIES[key]
+            zoo_service_id = getattr(zoo_keeper, key + '_id')
+            output_json[key] = {} if zoo_service_id is None else zoo_service_jsons[(entity, zoo_service_id)]
+        output_jsons.append(output_json)
+    return output_jsons
+
+
+def _get_chunks(iterable, chunk_size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _get_unique_lookups(zoo_keepers: list, relations=tuple(KEYS_TO_ENTITIES)) -> list:
+    lookups = {}
+    for zoo_keeper in zoo_keepers:
+        for key in relations:
+            entity = KEYS_TO_ENTITIES[key]
+            zoo_service_id = getattr(zoo_keeper, key + '_id')
+            if zoo_service_id is not None:
+                lookups[(entity, zoo_service_id)] = None
+    return list(lookups)
+
+
+def _is_cacheable(zoo_keeper_json: dict) -> bool:
+    return not any(
+        'error' in zoo_keeper_json[key] or zoo_keeper_json[key].get('stale') for key in KEYS_TO_ENTITIES
+    )
+
+
+def _get_zoo_service_json(method, zoo_service_id) -> dict:
+    try:
+        return method(zoo_service_id)
+    except (BadResponse, NoResponse) as e:
+        return json.loads(e.args[0])
+
+
+def _get_catalog(method) -> list:
+    try:
+        return method()
+    except (BadResponse, NoResponse):
+        return []
 
 
 def _get_code(json_obj):
@@ -119,6 +678,149 @@ def _convert_json(json_data):
     return {key: _convert_value(value) for key, value in json_data.items()}
 
 
+def _filter(query, filters: dict = None):
+    """
+    every filter must match. they are applied in the query, so filtered out rows are never enriched.
+
+    :param filters: any of ZOO_KEEPER_FILTERS.
+                    zoo_id, favorite_monkey_id, dream_monkey_id: an id, or null
+                    min_age, max_age: inclusive bounds
+                    name_prefix: the start of the name, matched with the zoo_keeper_name index
+    :raise: BadData
+    """
+    filters = filters or {}
+    unknown = set(filters) - set(ZOO_KEEPER_FILTERS)
+    if unknown:
+        raise BadData("unknown filters: {}. filters: {}".format(unknown, ZOO_KEEPER_FILTERS))
+    for key in ('zoo_id', 'favorite_monkey_id', 'dream_monkey_id', 'min_age', 'max_age'):
+        if key not in filters:
+            continue
+        value = _convert_value(filters[key])
+        nullable = key.endswith('_id')
+        if not isinstance(value, int) and not (nullable and value is None):
+            raise BadData("{} must be an integer{}: {}".format(key, ' or null' if nullable else '', value))
+        if key == 'min_age':
+            query = query.filter(ZooKeeper.age >= value)
+        elif key == 'max_age':
+            query = query.filter(ZooKeeper.age <= value)
+        else:
+            query = query.filter(getattr(ZooKeeper, key) == value)
+    if 'name_prefix' in filters:
+        prefix = str(filters['name_prefix']).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(ZooKeeper.name.like(prefix + '%', escape='\\'))
+    return query
+
+
+def _get_etag(body: str, version=None) -> str:
+    """
+    strong, as it is a hash of the body. a zoo keeper's etag starts with its row version, for If-Match.
+    """
+    digest = hashlib.sha1(body.encode()).hexdigest()[:20]
+    return digest if version is None else '{}-{}'.format(version, digest)
+
+
+def _get_conditional_response(body: str, etag, if_none_match, headers: dict) -> tuple:
+    """
+    :param if_none_match: etags the client has, or {'*'}. a match gets 304 without a body.
+    """
+    headers['ETag'] = '"{}"'.format(etag)
+    if if_none_match and ('*' in if_none_match or etag in if_none_match):
+        return '', 304, headers
+    return body, 200, headers
+
+
+def _raise_for_stale_version(zoo_keeper: ZooKeeper, if_match):
+    """
+    :param if_match: strong etags from an If-Match header, or {'*'}. it is met if one of them starts
+                     with the zoo keeper's current version, whatever the zoo service data was.
+                     None if there was no If-Match header, an empty set is never met.
+    :raise: StaleVersion
+    """
+    if if_match is None or '*' in if_match:
+        return
+    versions = {etag.split('-', 1)[0] for etag in if_match}
+    if str(zoo_keeper.version) not in versions:
+        msg = "zoo keeper: {} is at version: {}, not one of If-Match: {}"
+        raise StaleVersion(msg.format(zoo_keeper.id, zoo_keeper.version, sorted(if_match)))
+
+
+def _commit_versioned(session: DataBaseSession, zoo_keeper_id):
+    """
+    :raise: StaleVersion if the row changed since it was read in this session
+    """
+    try:
+        session.commit()
+    except StaleDataError:
+        session.rollback()
+        raise StaleVersion("zoo keeper: {} was changed by another request".format(zoo_keeper_id))
+
+
+def _split_names(names: str) -> list:
+    return [name.strip() for name in names.split(',') if name.strip()]
+
+
+def _get_location_header(zoo_keeper_id) -> dict:
+    return {'Location': ZOO_KEEPER_LOCATION.format(zoo_keeper_id)}
+
+
+def _get_ids(ids) -> list:
+    """
+    :param ids: a list of ints or digit strings. anything else, like a string or a float, is rejected
+                rather than read as some other ids.
+    :raise: BadData
+    """
+    if not isinstance(ids, list) or not all(_is_id(zoo_keeper_id) for zoo_keeper_id in ids):
+        raise BadData("ids must be a list of integers: {}".format(ids))
+    return [int(zoo_keeper_id) for zoo_keeper_id in ids]
+
+
+def _is_id(value) -> bool:
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, int) or isinstance(value, str) and value.isdecimal()
+
+
+def _raise_bad_values(kwargs: dict, partial=False):
+    """
+    checks what the zoo_keeper columns would reject, so that one bad row does not fail a whole insert
+    or update with a DB error.
+
+    :param kwargs: converted json, see _convert_json
+    :param partial: check only the keys kwargs has, as for an update
+    :raise: BadData
+    """
+    for key in ('name', 'age', 'zoo_id', 'favorite_monkey_id', 'dream_monkey_id'):
+        if not partial or key in kwargs:
+            _raise_bad_value(key, kwargs.get(key))
+
+
+def _raise_bad_value(key, value):
+    """
+    :raise: BadData
+    """
+    if key == 'name':
+        if value is None or not 0 < len(str(value)) <= ZooKeeper.name.type.length:
+            raise BadData("name must be 1 to {} characters: {}".format(ZooKeeper.name.type.length, value))
+    elif not (value is None and key != 'age' or isinstance(value, int) and not isinstance(value, bool)):
+        raise BadData("{} must be an integer{}: {}".format(key, '' if key == 'age' else ' or null', value))
+
+
+def _get_name_key(name: str) -> str:
+    """
+    the name column's collation ignores case and trailing spaces, so names equal in the DB have equal keys.
+    """
+    return name.rstrip(' ').lower()
+
+
+def _get_insert_row(kwargs: dict) -> dict:
+    """
+    executemany needs every row to have the same keys.
+    """
+    row = {'zoo_id': None, 'favorite_monkey_id': None, 'dream_monkey_id': None}
+    row.update(kwargs)
+    return row
+
+
 def _convert_value(value):
     if not isinstance(value, str):
         return value
@@ -0,0 +1,32 @@
+import time
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline(object):
+    """
+    a wall time budget for one request, shared by its DB queries and zoo service calls.
+
+    :param budget: seconds from now until the deadline
+    """
+    def __init__(self, budget):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return max(0., self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def get_timeout(self, timeout) -> float:
+        """
+        :return: timeout, cut down to what is left of the budget
+        """
+        return min(timeout, self.remaining())
+
+    def raise_if_expired(self, action):
+        if self.expired():
+            raise DeadlineExceeded('deadline of {} seconds exceeded before: {}'.format(self.budget, action))
@@ -0,0 +1,48 @@
+"""
+NOTE: EnrichmentExecutor is shared by every DBRequestHandler in the process, so max_workers caps the zoo
+service lookups of all requests together. It is sized with EnrichmentExecutor.configure(...) before serving
+requests.
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class SharedExecutor(object):
+    """
+    a ThreadPoolExecutor created on first use, that callers submit to but never shut down.
+
+    :param max_workers: threads running submitted calls at once, the rest wait in its queue
+    """
+    def __init__(self, max_workers=6):
+        self.max_workers = max_workers
+
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def configure(self, max_workers=None):
+        """
+        calls already submitted finish on the threads of the previous executor.
+        """
+        with self._lock:
+            if max_workers is not None:
+                self.max_workers = max_workers
+            self._shutdown()
+
+    def submit(self, function, *args) -> Future:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            return self._executor.submit(function, *args)
+
+    def shutdown(self):
+        with self._lock:
+            self._shutdown()
+
+    def _shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+EnrichmentExecutor = SharedExecutor()
@@ -1,14 +1,25 @@
+import json
+import time
 from functools import partial
+from typing import Optional
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from sqlalchemy import create_engine
 from sqlalchemy.exc import OperationalError
 from werkzeug.exceptions import BadRequest
 
 from zoo_keeper_server import USER, DB
 from zoo_keeper_server.data_base_session import DataBaseSession, data_base_session_scope
-from zoo_keeper_server.db_request_handler import DBRequestHandler, BadData, BadId
+from zoo_keeper_server.db_request_handler import DBRequestHandler, BadData, BadId, StaleVersion, ZOO_KEEPER_FILTERS
+from zoo_keeper_server.deadline import Deadline, DeadlineExceeded
+from zoo_keeper_server.enrichment_executor import EnrichmentExecutor
 from zoo_keeper_server.zoo_service_request_handler import ZooServiceRequestHandler
+from zoo_keeper_server.circuit_breaker import ZooServiceBreakers
+from zoo_keeper_server.lookup_cache import ZooServiceCache, ZooKeeperCache
+from zoo_keeper_server.replica_router import DataBaseReplicas
+from zoo_keeper_server.retry_policy import ZooServiceRetryPolicy
+from zoo_keeper_server.single_flight import ZooServiceFlights
+from zoo_keeper_server.zoo_service_session import ZooServiceSession
 
 app = Flask(__name__)
 app.config.from_object('zoo_keeper_server.flask_app_default_config')
@@ -26,54 +37,159 @@ app_engine = create_engine(
 
 DataBaseSession.configure(bind=app_engine)
 
+DataBaseReplicas.configure(
+    replicas=[
+        create_engine("mysql://{}@{}/{}".format(USER, host_name, DB), encoding='latin1')
+        for host_name in app.config.get('DB_REPLICA_HOST_NAMES') or []
+    ],
+    strategy=app.config.get('DB_REPLICA_STRATEGY')
+)
+
+ZooServiceSession.configure(
+    pool_connections=app.config.get('ZOO_SERVICE_POOL_CONNECTIONS'),
+    pool_maxsize=max(app.config.get('ZOO_SERVICE_POOL_MAXSIZE'), app.config.get('ENRICHMENT_MAX_WORKERS')),
+    idle_timeout=app.config.get('ZOO_SERVICE_POOL_IDLE_TIMEOUT')
+)
+
+ZooServiceCache.configure(
+    max_entries=app.config.get('ZOO_SERVICE_CACHE_MAX_ENTRIES'),
+    ttls={
+        'zoo': app.config.get('ZOO_SERVICE_CACHE_ZOO_TTL'),
+        'monkey': app.config.get('ZOO_SERVICE_CACHE_MONKEY_TTL')
+    },
+    negative_ttl=app.config.get('ZOO_SERVICE_CACHE_NEGATIVE_TTL'),
+    stale_while_revalidate=app.config.get('ZOO_SERVICE_CACHE_STALE_WHILE_REVALIDATE'),
+    stale_if_error=app.config.get('ZOO_SERVICE_CACHE_STALE_IF_ERROR')
+)
+
+ZooKeeperCache.configure(
+    max_entries=app.config.get('ZOO_KEEPER_CACHE_MAX_ENTRIES'),
+    default_ttl=app.config.get('ZOO_KEEPER_CACHE_TTL')
+)
+
+EnrichmentExecutor.configure(max_workers=app.config.get('ENRICHMENT_MAX_WORKERS'))
+
+ZooServiceBreakers.configure(
+    failure_threshold=app.config.get('ZOO_SERVICE_BREAKER_FAILURE_THRESHOLD'),
+    reset_timeout=app.config.get('ZOO_SERVICE_BREAKER_RESET_TIMEOUT'),
+    half_open_max_calls=app.config.get('ZOO_SERVICE_BREAKER_HALF_OPEN_MAX_CALLS')
+)
+
+ZooServiceRetryPolicy.configure(
+    base_delay=app.config.get('ZOO_SERVICE_RETRY_BASE_DELAY'),
+    max_delay=app.config.get('ZOO_SERVICE_RETRY_MAX_DELAY'),
+    budget_ratio=app.config.get('ZOO_SERVICE_RETRY_BUDGET_RATIO'),
+    retry_reserve=app.config.get('ZOO_SERVICE_RETRY_RESERVE')
+)
+
 ZOO_SERVICE_URL = app.config.get('ZOO_SERVICE_URL')
+ENRICHMENT_BULK_THRESHOLD = app.config.get('ENRICHMENT_BULK_THRESHOLD')
+REQUEST_DEADLINE = app.config.get('REQUEST_DEADLINE')
+ZOO_KEEPERS_PAGE_SIZE = app.config.get('ZOO_KEEPERS_PAGE_SIZE')
+ZOO_KEEPERS_MAX_PAGE_SIZE = app.config.get('ZOO_KEEPERS_MAX_PAGE_SIZE')
+ZOO_KEEPERS_STREAM_CHUNK_SIZE = app.config.get('ZOO_KEEPERS_STREAM_CHUNK_SIZE')
+ZOO_KEEPERS_INSERT_BATCH_SIZE = app.config.get('ZOO_KEEPERS_INSERT_BATCH_SIZE')
+ZOO_KEEPERS_RETURN_MINIMAL = app.config.get('ZOO_KEEPERS_RETURN_MINIMAL')
+DB_PRIMARY_STICKINESS = app.config.get('DB_PRIMARY_STICKINESS')
+DEADLINE_HEADER = 'X-Request-Deadline'
+JSON_MIMETYPE = 'application/json'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+PRIMARY_COOKIE = 'db_primary_until'
+MUTATING_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
 
 
 @app.route('/zoos/', methods=['GET'])
 def all_zoos():
-    handler = DBRequestHandler(ZooServiceRequestHandler(ZOO_SERVICE_URL))
+    handler = _create_handler()
     return handler.get_all_zoos()
 
 
 @app.route('/monkeys/', methods=['GET'])
 def all_monkeys():
-    handler = DBRequestHandler(ZooServiceRequestHandler(ZOO_SERVICE_URL))
+    handler = _create_handler()
     return handler.get_all_monkeys()
 
 
 @app.route('/zoo_keepers/', methods=['GET', 'POST'])
 def all_zoo_keepers():
-    with data_base_session_scope() as session:
-        handler = DBRequestHandler(ZooServiceRequestHandler(ZOO_SERVICE_URL))
+    stream_mimetype = _get_stream_mimetype()
+    if _get_method() == 'GET' and stream_mimetype is not None and 'ids' not in request.args:
+        return _stream_zoo_keepers(stream_mimetype)
+
+    with data_base_session_scope(read_only=_is_read_only()) as session:
+        handler = _create_handler()
         method = _get_method()
 
         request_json = _get_json()
 
+        if 'ids' in request.args:
+            get_action = partial(handler.get_zoo_keepers_by_ids, session, request.args['ids'], **_get_projection_args())
+        else:
+            get_action = partial(
+                handler.get_all_zoo_keepers, session, **_get_page_args(), **_get_projection_args(),
+                **_get_filter_args(), **_get_if_none_match_args()
+            )
         actions = {
-            'GET': partial(handler.get_all_zoo_keepers, session),
+            'GET': get_action,
             'POST': partial(handler.post_zoo_keeper, session, request_json),
         }
         reply = actions[method]()
     return reply
 
 
+@app.route('/zoo_keepers/bulk', methods=['POST', 'PATCH', 'DELETE'])
+def bulk_zoo_keepers():
+    with data_base_session_scope() as session:
+        handler = _create_handler()
+        method = _get_method()
+
+        if method == 'POST':
+            enrich = request.args.get('enrich', '').lower() in ('1', 'true')
+            return handler.post_zoo_keepers(session, _get_bulk_json(), enrich=enrich)
+
+        request_json = _get_json()
+
+        actions = {
+            'PATCH': partial(handler.patch_zoo_keepers, session, request_json),
+            'DELETE': partial(handler.delete_zoo_keepers, session, request_json)
+        }
+        reply = actions[method]()
+    return reply
+
+
 @app.route('/zoo_keepers/<zoo_keeper_id>', methods=['GET', 'PUT', 'DELETE'])
 def single_zoo_keeper(zoo_keeper_id):
-    with data_base_session_scope() as session:
-        handler = DBRequestHandler(ZooServiceRequestHandler(ZOO_SERVICE_URL))
+    with data_base_session_scope(read_only=_is_read_only()) as session:
+        handler = _create_handler()
         method = _get_method()
 
         request_json = _get_json()
 
         actions = {
-            'GET': partial(handler.get_zoo_keeper, session, zoo_keeper_id),
-            'PUT': partial(handler.put_zoo_keeper, session, zoo_keeper_id, request_json),
-            'DELETE': partial(handler.delete_zoo_keeper, session, zoo_keeper_id)
+            'GET': partial(
+                handler.get_zoo_keeper, session, zoo_keeper_id, **_get_projection_args(), **_get_if_none_match_args()
+            ),
+            'PUT': partial(handler.put_zoo_keeper, session, zoo_keeper_id, request_json, **_get_if_match_args()),
+            'DELETE': partial(handler.delete_zoo_keeper, session, zoo_keeper_id, **_get_if_match_args())
         }
         reply = actions[method]()
     return reply
 
 
+@app.after_request
+def stick_to_primary(response):
+    """
+    after a write, this client's reads go to the primary for DB_PRIMARY_STICKINESS seconds,
+    so they do not miss the write on a lagging replica. without replicas there is nothing to stick to.
+    """
+    if not DB_PRIMARY_STICKINESS or not len(DataBaseReplicas):
+        return response
+    if request.method in MUTATING_METHODS and response.status_code < 400:
+        primary_until = time.time() + DB_PRIMARY_STICKINESS
+        response.set_cookie(PRIMARY_COOKIE, str(primary_until), max_age=DB_PRIMARY_STICKINESS)
+    return response
+
+
 @app.errorhandler(BadRequest)
 def handle_bad_request(e):
     code = 400
@@ -92,6 +208,24 @@ def handle_db_not_responding(e):
     return jsonify(error=code, title=title, error_type=e_type, text=text), code
 
 
+@app.errorhandler(DeadlineExceeded)
+def handle_deadline_exceeded(e):
+    code = 504
+    e_type = e.__class__.__name__
+    text = e.args[0]
+    title = "gateway timeout"
+    return jsonify(error=code, title=title, error_type=e_type, text=text), code
+
+
+@app.errorhandler(StaleVersion)
+def handle_stale_version(e):
+    code = 412
+    e_type = e.__class__.__name__
+    text = e.args[0]
+    title = "precondition failed"
+    return jsonify(error=code, title=title, error_type=e_type, text=text), code
+
+
 @app.errorhandler(404)
 def handle_not_found(e):
     return jsonify(error=404, title="not found", text=str(e)), 404
@@ -115,6 +249,60 @@ def handle_bad_id(e):
     return jsonify(error=code, title=title, error_type=e_type, text=text), code
 
 
+def _create_handler() -> DBRequestHandler:
+    deadline = _get_deadline()
+    zoo_service_rh = ZooServiceRequestHandler(
+        ZOO_SERVICE_URL,
+        cache=ZooServiceCache,
+        breakers=ZooServiceBreakers,
+        deadline=deadline,
+        retry_policy=ZooServiceRetryPolicy,
+        flights=ZooServiceFlights
+    )
+    return DBRequestHandler(
+        zoo_service_rh,
+        bulk_threshold=ENRICHMENT_BULK_THRESHOLD,
+        deadline=deadline,
+        page_size=ZOO_KEEPERS_PAGE_SIZE,
+        max_page_size=ZOO_KEEPERS_MAX_PAGE_SIZE,
+        stream_chunk_size=ZOO_KEEPERS_STREAM_CHUNK_SIZE,
+        insert_batch_size=ZOO_KEEPERS_INSERT_BATCH_SIZE,
+        return_minimal=_get_return_minimal(),
+        response_cache=ZooKeeperCache
+    )
+
+
+def _get_deadline() -> Optional[Deadline]:
+    """
+    the budget is REQUEST_DEADLINE seconds, or the X-Request-Deadline header if that is shorter.
+
+    :raise: BadRequest
+    """
+    budget = REQUEST_DEADLINE
+    header_value = request.headers.get(DEADLINE_HEADER)
+    if header_value is not None:
+        try:
+            header_budget = float(header_value)
+        except ValueError:
+            raise BadRequest("{} must be a number of seconds: {}".format(DEADLINE_HEADER, header_value))
+        budget = header_budget if budget is None else min(budget, header_budget)
+    if budget is None:
+        return None
+    return Deadline(budget)
+
+
+def _get_return_minimal() -> bool:
+    """
+    a Prefer: return=minimal or return=representation header overrides ZOO_KEEPERS_RETURN_MINIMAL.
+    """
+    preferences = {preference.strip() for preference in request.headers.get('Prefer', '').split(',')}
+    if 'return=minimal' in preferences:
+        return True
+    if 'return=representation' in preferences:
+        return False
+    return bool(ZOO_KEEPERS_RETURN_MINIMAL)
+
+
 def _get_json() -> dict:
     """
     :raise: BadRequest
@@ -128,6 +316,110 @@ def _get_json() -> dict:
         raise BadRequest(msg)
 
 
+def _get_bulk_json() -> list:
+    """
+    the body is a JSON array, or one JSON object per line if its content type is NDJSON_MIMETYPE.
+
+    :raise: BadRequest
+    """
+    if request.mimetype == NDJSON_MIMETYPE:
+        lines = request.get_data(as_text=True).splitlines()
+        try:
+            return [json.loads(line) for line in lines if line.strip()]
+        except ValueError:
+            raise BadRequest("each line must be one JSON object: {}".format(request.data))
+    request_json = _get_json()
+    if not isinstance(request_json, list):
+        raise BadRequest("expected a JSON array of zoo keepers: {}".format(request.data))
+    return request_json
+
+
+def _stream_zoo_keepers(mimetype) -> Response:
+    """
+    the first chunk is read before responding, so that bad arguments and errors of the query get their usual
+    responses. errors in later chunks end the stream early.
+    """
+    handler = _create_handler()
+    stream_zoo_keepers = partial(handler.stream_zoo_keepers, **_get_projection_args(), **_get_filter_args())
+    chunks = _generate_with_session(
+        _is_read_only(), stream_zoo_keepers, mimetype == NDJSON_MIMETYPE, request.args.get('after')
+    )
+    first_chunk = next(chunks)
+    return Response(_prepend(first_chunk, chunks), mimetype=mimetype)
+
+
+def _generate_with_session(read_only, method, *args):
+    with data_base_session_scope(read_only=read_only) as session:
+        yield from method(session, *args)
+
+
+def _prepend(first, generator):
+    yield first
+    yield from generator
+
+
+def _get_stream_mimetype() -> Optional[str]:
+    """
+    :return: NDJSON_MIMETYPE if the client prefers it, JSON_MIMETYPE if it asks for ?stream=true,
+             otherwise None for an ordinary response
+    """
+    if request.accept_mimetypes.best_match([JSON_MIMETYPE, NDJSON_MIMETYPE]) == NDJSON_MIMETYPE:
+        return NDJSON_MIMETYPE
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return JSON_MIMETYPE
+    return None
+
+
+def _get_page_args() -> dict:
+    return {key: request.args[key] for key in ('after', 'limit') if key in request.args}
+
+
+def _get_projection_args() -> dict:
+    return {key: request.args[key] for key in ('fields', 'expand') if key in request.args}
+
+
+def _get_filter_args() -> dict:
+    filters = {key: request.args[key] for key in ZOO_KEEPER_FILTERS if key in request.args}
+    return {'filters': filters} if filters else {}
+
+
+def _is_read_only() -> bool:
+    """
+    GET and HEAD are read only, unless the PRIMARY_COOKIE set by stick_to_primary has not expired.
+    """
+    if _get_method() != 'GET':
+        return False
+    try:
+        primary_until = float(request.cookies.get(PRIMARY_COOKIE, 0))
+    except ValueError:
+        primary_until = 0
+    return time.time() >= primary_until
+
+
+def _get_if_none_match_args() -> dict:
+    """
+    If-None-Match uses weak comparison, so weak etags match too.
+    """
+    if not request.if_none_match:
+        return {}
+    return {'if_none_match': _get_etags(request.if_none_match, include_weak=True)}
+
+
+def _get_if_match_args() -> dict:
+    """
+    If-Match uses strong comparison, so weak etags are dropped and never match.
+    """
+    if 'If-Match' not in request.headers:
+        return {}
+    return {'if_match': _get_etags(request.if_match, include_weak=False)}
+
+
+def _get_etags(etags, include_weak) -> set:
+    if etags.star_tag:
+        return {'*'}
+    return etags.as_set(include_weak=include_weak)
+
+
 def _get_method():
     method = request.method
     if method == 'HEAD':
@@ -1,3 +1,35 @@
 
 DB_HOST_NAME = "localhost"
 ZOO_SERVICE_URL = 'http://localhost:8080'
+ZOO_SERVICE_POOL_CONNECTIONS = 10
+# at least ENRICHMENT_MAX_WORKERS, as each worker holds a connection while it waits for the zoo service.
+# connections over the pool size are closed after one request. a smaller value is raised to the worker count.
+ZOO_SERVICE_POOL_MAXSIZE = 24
+ZOO_SERVICE_POOL_IDLE_TIMEOUT = 60
+# zoo service lookups running at once for the whole process. ZOO_SERVICE_POOL_MAXSIZE is kept at least this.
+ENRICHMENT_MAX_WORKERS = 24
+ENRICHMENT_BULK_THRESHOLD = 50
+ZOO_SERVICE_CACHE_MAX_ENTRIES = 1000
+ZOO_SERVICE_CACHE_ZOO_TTL = 300
+ZOO_SERVICE_CACHE_MONKEY_TTL = 300
+ZOO_SERVICE_CACHE_NEGATIVE_TTL = 30
+ZOO_SERVICE_CACHE_STALE_WHILE_REVALIDATE = 30
+ZOO_SERVICE_CACHE_STALE_IF_ERROR = 600
+ZOO_SERVICE_BREAKER_FAILURE_THRESHOLD = 5
+ZOO_SERVICE_BREAKER_RESET_TIMEOUT = 30
+ZOO_SERVICE_BREAKER_HALF_OPEN_MAX_CALLS = 1
+REQUEST_DEADLINE = 10
+ZOO_SERVICE_RETRY_BASE_DELAY = 0.05
+ZOO_SERVICE_RETRY_MAX_DELAY = 1.
+ZOO_SERVICE_RETRY_BUDGET_RATIO = 0.2
+ZOO_SERVICE_RETRY_RESERVE = 10
+ZOO_KEEPERS_PAGE_SIZE = 100
+ZOO_KEEPERS_MAX_PAGE_SIZE = 1000
+ZOO_KEEPERS_STREAM_CHUNK_SIZE = 100
+ZOO_KEEPERS_INSERT_BATCH_SIZE = 500
+ZOO_KEEPERS_RETURN_MINIMAL = False
+DB_REPLICA_HOST_NAMES = []
+DB_REPLICA_STRATEGY = 'round_robin'
+DB_PRIMARY_STICKINESS = 5
+ZOO_KEEPER_CACHE_MAX_ENTRIES = 10000
+ZOO_KEEPER_CACHE_TTL = 60
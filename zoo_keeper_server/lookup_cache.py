@@ -0,0 +1,190 @@
+"""
+NOTE: ZooServiceCache is shared by every ZooServiceRequestHandler given cache=ZooServiceCache,
+and ZooKeeperCache by every DBRequestHandler given response_cache=ZooKeeperCache.
+Sizes and TTLs are set with their configure(...) before serving requests.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class NotFound(object):
+    """
+    a cached 404 from the zoo service. error_text is the body BadResponse was raised with.
+    """
+    def __init__(self, error_text):
+        self.error_text = error_text
+
+
+class CacheEntry(object):
+    """
+    validators: headers to revalidate value with once it expires, e.g. {'If-None-Match': etag}
+    """
+    def __init__(self, value, expires_at, validators=None):
+        self.value = value
+        self.expires_at = expires_at
+        self.validators = validators or {}
+
+    def is_expired(self, now):
+        return now >= self.expires_at
+
+
+class LookupCache(object):
+    """
+    A thread safe LRU cache of zoo service records keyed by (entity, id).
+
+    :param max_entries: entries kept before the least recently used one is evicted
+    :param ttls: {entity: seconds} how long a record of that entity stays fresh
+    :param default_ttl: seconds for entities missing from ttls
+    :param negative_ttl: seconds a NotFound stays cached, for every entity
+    :param stale_while_revalidate: seconds after expiry a record may be served while it is refreshed
+    :param stale_if_error: seconds after expiry a record may be served when the zoo service fails
+    """
+    def __init__(self, max_entries=1000, ttls=None, default_ttl=300, negative_ttl=30, stale_while_revalidate=0,
+                 stale_if_error=0):
+        self.max_entries = max_entries
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def configure(self, max_entries=None, ttls=None, default_ttl=None, negative_ttl=None,
+                  stale_while_revalidate=None, stale_if_error=None):
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if ttls is not None:
+                self.ttls.update(ttls)
+            if default_ttl is not None:
+                self.default_ttl = default_ttl
+            if negative_ttl is not None:
+                self.negative_ttl = negative_ttl
+            if stale_while_revalidate is not None:
+                self.stale_while_revalidate = stale_while_revalidate
+            if stale_if_error is not None:
+                self.stale_if_error = stale_if_error
+            self._entries.clear()
+
+    def get_ttl(self, entity):
+        return self.ttls.get(entity, self.default_ttl)
+
+    def get(self, entity, entity_id):
+        """
+        :return: the cached value, a NotFound, or None if missing or expired
+        """
+        key = (entity, entity_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.is_expired(time.monotonic()):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if isinstance(entry.value, NotFound):
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return entry.value
+
+    def peek(self, entity, entity_id):
+        """
+        like get, but a miss is not counted, for callers that count it when they fetch the value with get.
+
+        :return: the cached value, a NotFound, or None if missing or expired
+        """
+        key = (entity, entity_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.is_expired(time.monotonic()):
+                return None
+            self._entries.move_to_end(key)
+            if isinstance(entry.value, NotFound):
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return entry.value
+
+    def get_stale(self, entity, entity_id):
+        """
+        expired entries are kept until evicted, so they can be revalidated or served stale.
+
+        :return: the CacheEntry of a record, or None
+        """
+        with self._lock:
+            entry = self._entries.get((entity, entity_id))
+            if entry is None or isinstance(entry.value, NotFound):
+                return None
+            return entry
+
+    def can_serve_while_revalidating(self, entry: CacheEntry) -> bool:
+        return time.monotonic() < entry.expires_at + self.stale_while_revalidate
+
+    def can_serve_on_error(self, entry: CacheEntry) -> bool:
+        return time.monotonic() < entry.expires_at + self.stale_if_error
+
+    def start_refresh(self, entity, entity_id) -> bool:
+        """
+        :return: False if the record is already being refreshed
+        """
+        with self._lock:
+            if (entity, entity_id) in self._refreshing:
+                return False
+            self._refreshing.add((entity, entity_id))
+            return True
+
+    def finish_refresh(self, entity, entity_id):
+        with self._lock:
+            self._refreshing.discard((entity, entity_id))
+
+    def set(self, entity, entity_id, value, ttl=None, validators=None):
+        if ttl is None:
+            ttl = self.get_ttl(entity)
+        key = (entity, entity_id)
+        with self._lock:
+            self._entries[key] = CacheEntry(value, time.monotonic() + ttl, validators)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def set_not_found(self, entity, entity_id, error_text):
+        self.set(entity, entity_id, NotFound(error_text), ttl=self.negative_ttl)
+
+    def invalidate(self, entity, entity_id):
+        with self._lock:
+            self._entries.pop((entity, entity_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.negative_hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+ZooServiceCache = LookupCache()
+ZooKeeperCache = LookupCache()
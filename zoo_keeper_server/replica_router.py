@@ -0,0 +1,80 @@
+"""
+NOTE: DataBaseReplicas is shared by every data_base_session_scope(read_only=True).
+Replica engines are set with DataBaseReplicas.configure(replicas=[engine, ...]) before serving requests.
+Without replicas, read only sessions use the primary engine bound to DataBaseSession.
+"""
+
+import threading
+
+ROUND_ROBIN = 'round_robin'
+LEAST_CONNECTIONS = 'least_connections'
+
+
+class ReplicaRouter(object):
+    """
+    picks a replica engine for each read only session.
+
+    round_robin: replicas in turn
+    least_connections: the replica with the fewest sessions open through this router
+
+    :param replicas: engines of the read replicas
+    :param strategy: ROUND_ROBIN or LEAST_CONNECTIONS
+    """
+    def __init__(self, replicas=(), strategy=ROUND_ROBIN):
+        _raise_for_bad_strategy(strategy)
+        self.strategy = strategy
+
+        self._replicas = list(replicas)
+        self._open_sessions = [0] * len(self._replicas)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def configure(self, replicas=None, strategy=None):
+        with self._lock:
+            if strategy is not None:
+                _raise_for_bad_strategy(strategy)
+                self.strategy = strategy
+            if replicas is not None:
+                self._replicas = list(replicas)
+                self._open_sessions = [0] * len(self._replicas)
+                self._next = 0
+
+    def acquire(self):
+        """
+        :return: a replica engine, to be given back with release(), or None if there are no replicas
+        """
+        with self._lock:
+            if not self._replicas:
+                return None
+            if self.strategy == ROUND_ROBIN:
+                index = self._next % len(self._replicas)
+                self._next += 1
+            else:
+                index = min(range(len(self._replicas)), key=self._open_sessions.__getitem__)
+            self._open_sessions[index] += 1
+            return self._replicas[index]
+
+    def release(self, replica):
+        with self._lock:
+            for index, known_replica in enumerate(self._replicas):
+                if known_replica is replica:
+                    self._open_sessions[index] = max(0, self._open_sessions[index] - 1)
+                    return
+
+    def __len__(self):
+        return len(self._replicas)
+
+    def stats(self) -> list:
+        """
+        :return: open sessions per replica, in configured order
+        """
+        with self._lock:
+            return list(self._open_sessions)
+
+
+def _raise_for_bad_strategy(strategy):
+    if strategy not in (ROUND_ROBIN, LEAST_CONNECTIONS):
+        raise ValueError("strategy must be {} or {}: {}".format(ROUND_ROBIN, LEAST_CONNECTIONS, strategy))
+
+
+DataBaseReplicas = ReplicaRouter()
@@ -0,0 +1,89 @@
+"""
+NOTE: ZooServiceRetryPolicy is shared by every ZooServiceRequestHandler given retry_policy=ZooServiceRetryPolicy.
+Delays and the budget are set with ZooServiceRetryPolicy.configure(...) before serving requests.
+"""
+
+import random
+import threading
+
+
+class RetryPolicy(object):
+    """
+    exponential backoff with full jitter, limited by a process wide retry budget.
+
+    every request adds budget_ratio to the budget and every retry takes 1 from it, so under sustained
+    failure retries stay at about budget_ratio of all requests. the budget starts full and holds at most
+    retry_reserve retries, which is the burst a quiet process can spend before the ratio applies.
+
+    :param base_delay: seconds, upper bound of the first backoff
+    :param max_delay: seconds, upper bound of any backoff
+    :param budget_ratio: retries earned per request
+    :param retry_reserve: most retries the budget can hold
+    """
+    def __init__(self, base_delay=0.05, max_delay=1., budget_ratio=0.2, retry_reserve=10):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.retry_reserve = retry_reserve
+
+        self._budget = float(retry_reserve)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def configure(self, base_delay=None, max_delay=None, budget_ratio=None, retry_reserve=None):
+        with self._lock:
+            if base_delay is not None:
+                self.base_delay = base_delay
+            if max_delay is not None:
+                self.max_delay = max_delay
+            if budget_ratio is not None:
+                self.budget_ratio = budget_ratio
+            if retry_reserve is not None:
+                self.retry_reserve = retry_reserve
+            self._budget = float(self.retry_reserve)
+            self._counts.clear()
+
+    def get_delay(self, retry_number) -> float:
+        """
+        :param retry_number: 1 for the first retry
+        :return: seconds, drawn uniformly from [0, min(max_delay, base_delay * 2 ** (retry_number - 1))]
+        """
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (retry_number - 1))
+        return random.uniform(0, ceiling)
+
+    def record_request(self, endpoint):
+        with self._lock:
+            self._get_counts(endpoint)['requests'] += 1
+            self._budget = min(self._budget + self.budget_ratio, float(self.retry_reserve))
+
+    def try_retry(self, endpoint) -> bool:
+        """
+        takes one retry from the budget.
+
+        :return: False if the budget is spent
+        """
+        with self._lock:
+            counts = self._get_counts(endpoint)
+            if self._budget < 1:
+                counts['budget_exhausted'] += 1
+                return False
+            self._budget -= 1
+            counts['retries'] += 1
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {endpoint: dict(counts) for endpoint, counts in self._counts.items()}
+
+    def clear(self):
+        with self._lock:
+            self._budget = float(self.retry_reserve)
+            self._counts.clear()
+
+    def _get_counts(self, endpoint) -> dict:
+        if endpoint not in self._counts:
+            self._counts[endpoint] = {'requests': 0, 'retries': 0, 'budget_exhausted': 0}
+        return self._counts[endpoint]
+
+
+ZooServiceRetryPolicy = RetryPolicy()
@@ -0,0 +1,92 @@
+"""
+NOTE: ZooServiceFlights is shared by every ZooServiceRequestHandler given flights=ZooServiceFlights,
+so that concurrent requests for the same zoo service url share one upstream request.
+"""
+
+import threading
+import time
+
+
+class FlightTimeout(TimeoutError):
+    pass
+
+
+class _Flight(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.is_error_shared = True
+
+
+class SingleFlight(object):
+    """
+    coalesces concurrent calls with the same key: the first caller runs the function, the ones arriving
+    while it runs wait for it and get the same result, or the same exception raised.
+    """
+    def __init__(self):
+        self.leaders = 0
+        self.coalesced = 0
+
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, timeout=None, is_shared=None):
+        """
+        :param key: hashable, calls with equal keys are coalesced
+        :param function: called without arguments
+        :param timeout: seconds a coalesced caller waits for running calls, None to wait until they end
+        :param is_shared: called with an exception function raised. if it returns False, the waiting callers
+                          do not get that exception and make the call again, one of them running function
+        :raise: FlightTimeout, or what function raised
+        :return: what function returned
+        """
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                is_leader = flight is None
+                if is_leader:
+                    flight = self._flights[key] = _Flight()
+                    self.leaders += 1
+                else:
+                    self.coalesced += 1
+
+            if is_leader:
+                return self._run(key, flight, function, is_shared)
+
+            remaining = None if expires_at is None else max(0., expires_at - time.monotonic())
+            if not flight.done.wait(remaining):
+                raise FlightTimeout("gave up waiting for {} after {} seconds".format(key, timeout))
+            if flight.error is None:
+                return flight.result
+            if flight.is_error_shared:
+                raise flight.error
+
+    def _run(self, key, flight: _Flight, function, is_shared):
+        try:
+            flight.result = function()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            flight.is_error_shared = is_shared is None or is_shared(e)
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self) -> dict:
+        """
+        :return: in_flight calls now, leaders that ran their function, coalesced calls that waited for one
+        """
+        with self._lock:
+            return {'in_flight': len(self._flights), 'leaders': self.leaders, 'coalesced': self.coalesced}
+
+    def clear(self):
+        with self._lock:
+            self.leaders = 0
+            self.coalesced = 0
+
+
+ZooServiceFlights = SingleFlight()
@@ -1,37 +1,116 @@
 from typing import Optional
 
-from zoo_keeper_server.zoo_service_request_handler import ZooServiceRequestHandler
+from zoo_keeper_server.lookup_cache import LookupCache
+from zoo_keeper_server.zoo_service_request_handler import ZooServiceRequestHandler, BadResponse
 
 
 class Validator(object):
-    def __init__(self, zoo_service_url):
-        self.zoo_service_rh = ZooServiceRequestHandler(zoo_service_url)
+    """
+    every public method is one validation pass. within a pass each zoo and monkey is fetched at most once,
+    and the monkeys listed in a fetched zoo are not fetched at all.
+    """
+    def __init__(self, zoo_service_url, cache: LookupCache = None):
+        self.zoo_service_rh = ZooServiceRequestHandler(zoo_service_url, cache=cache)
+        self._zoos = {}
+        self._monkeys = {}
 
     def is_zoo_ok(self, zoo_id: Optional[int]):
+        self._start_pass()
+        return self._is_zoo_ok(zoo_id)
+
+    def is_favorite_monkey_ok(self, monkey_id: Optional[int], zoo_id: Optional[int]):
+        self._start_pass()
+        return self._is_favorite_monkey_ok(monkey_id, zoo_id)
+
+    def is_dream_monkey_ok(self, monkey_id: Optional[int], zoo_id: Optional[int]):
+        self._start_pass()
+        return self._is_dream_monkey_ok(monkey_id, zoo_id)
+
+    def raise_value_errors(self, zoo_id, favorite_monkey_id, dream_monkey_id):
+        self._start_pass()
+        error = self._get_error(zoo_id, favorite_monkey_id, dream_monkey_id)
+        if error is not None:
+            raise ValueError(error)
+
+    def validate_many(self, zoo_keeper_jsons: list) -> list:
+        """
+        fetches every zoo first, then only the monkeys those zoos did not list.
+
+        :param zoo_keeper_jsons: dicts with any of zoo_id, favorite_monkey_id, dream_monkey_id
+        :raise: NoResponse
+        :return: for each json, the raise_value_errors message or None
+        """
+        self._start_pass()
+        id_sets = [_get_ids(zoo_keeper_json) for zoo_keeper_json in zoo_keeper_jsons]
+        for zoo_id, _, _ in id_sets:
+            if zoo_id is not None:
+                self._get_zoo(zoo_id)
+        return [self._get_error(*ids) for ids in id_sets]
+
+    def _start_pass(self):
+        self._zoos = {}
+        self._monkeys = {}
+
+    def _is_zoo_ok(self, zoo_id: Optional[int]):
         if zoo_id is None:
             return True
-        return self.zoo_service_rh.has_zoo(zoo_id)
+        return self._get_zoo(zoo_id) is not None
 
-    def is_favorite_monkey_ok(self, monkey_id: Optional[int], zoo_id: Optional[int]):
+    def _is_favorite_monkey_ok(self, monkey_id: Optional[int], zoo_id: Optional[int]):
         if monkey_id is None:
             return True
         if zoo_id is None:
             return False
-        return (self.zoo_service_rh.has_monkey(monkey_id) and
-                self.zoo_service_rh.is_monkey_in_zoo(monkey_id, zoo_id))
+        monkey = self._get_monkey(monkey_id)
+        return monkey is not None and monkey['zoo_id'] == zoo_id
 
-    def is_dream_monkey_ok(self, monkey_id: Optional[int], zoo_id: Optional[int]):
+    def _is_dream_monkey_ok(self, monkey_id: Optional[int], zoo_id: Optional[int]):
         if monkey_id is None:
             return True
         if zoo_id is None:
             return False
-        return (self.zoo_service_rh.has_monkey(monkey_id) and
-                not self.zoo_service_rh.is_monkey_in_zoo(monkey_id, zoo_id))
+        monkey = self._get_monkey(monkey_id)
+        return monkey is not None and monkey['zoo_id'] != zoo_id
 
-    def raise_value_errors(self, zoo_id, favorite_monkey_id, dream_monkey_id):
-        if not self.is_zoo_ok(zoo_id):
-            raise ValueError('zoo: "{}" does not exists'.format(zoo_id))
-        if not self.is_favorite_monkey_ok(favorite_monkey_id, zoo_id):
-            raise ValueError('monkey: "{}" does not exist or is not in zoo: "{}"'.format(favorite_monkey_id, zoo_id))
-        if not self.is_dream_monkey_ok(dream_monkey_id, zoo_id):
-            raise ValueError('monkey: "{}" does not exist or IS in zoo: "{}"'.format(dream_monkey_id, zoo_id))
+    def _get_error(self, zoo_id, favorite_monkey_id, dream_monkey_id) -> Optional[str]:
+        if not self._is_zoo_ok(zoo_id):
+            return 'zoo: "{}" does not exists'.format(zoo_id)
+        if not self._is_favorite_monkey_ok(favorite_monkey_id, zoo_id):
+            return 'monkey: "{}" does not exist or is not in zoo: "{}"'.format(favorite_monkey_id, zoo_id)
+        if not self._is_dream_monkey_ok(dream_monkey_id, zoo_id):
+            return 'monkey: "{}" does not exist or IS in zoo: "{}"'.format(dream_monkey_id, zoo_id)
+        return None
+
+    def _get_zoo(self, zoo_id) -> Optional[dict]:
+        """
+        :raise: NoResponse
+        :return: the zoo, or None if it does not exist
+        """
+        if zoo_id not in self._zoos:
+            zoo = _get_or_none(self.zoo_service_rh.get_zoo, zoo_id)
+            self._zoos[zoo_id] = zoo
+            if zoo is not None:
+                for monkey in zoo.get('monkeys', []):
+                    self._monkeys.setdefault(monkey['id'], monkey)
+        return self._zoos[zoo_id]
+
+    def _get_monkey(self, monkey_id) -> Optional[dict]:
+        """
+        :raise: NoResponse
+        :return: the monkey, or None if it does not exist
+        """
+        if monkey_id not in self._monkeys:
+            self._monkeys[monkey_id] = _get_or_none(self.zoo_service_rh.get_monkey, monkey_id)
+        return self._monkeys[monkey_id]
+
+
+def _get_ids(zoo_keeper_json: dict) -> tuple:
+    keys = ('zoo_id', 'favorite_monkey_id', 'dream_monkey_id')
+    return tuple(zoo_keeper_json.get(key) for key in keys)
+
+
+def _get_or_none(method, zoo_service_id) -> Optional[dict]:
+    try:
+        return method(zoo_service_id)
+    except BadResponse:
+        return None
@@ -1,14 +1,23 @@
 from zoo_keeper_server import ZOO_KEEPER_TABLE
 
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Index, Integer, String
 from sqlalchemy.ext.declarative import declarative_base
 
 
 Base = declarative_base()
 
+ZOO_KEEPER_COLUMNS = ('id', 'name', 'age', 'zoo_id', 'favorite_monkey_id', 'dream_monkey_id')
+
 
 class ZooKeeper(Base):
     __tablename__ = ZOO_KEEPER_TABLE
+    __table_args__ = (
+        Index('zoo_keeper_name', 'name'),
+        Index('zoo_keeper_zoo_id', 'zoo_id'),
+        Index('zoo_keeper_favorite_monkey_id', 'favorite_monkey_id'),
+        Index('zoo_keeper_dream_monkey_id', 'dream_monkey_id'),
+        Index('zoo_keeper_age', 'age'),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String(20), unique=True, nullable=False)
@@ -18,6 +27,10 @@ class ZooKeeper(Base):
     favorite_monkey_id = Column(Integer)
     dream_monkey_id = Column(Integer)
 
+    version = Column(Integer, nullable=False, default=1)
+
+    __mapper_args__ = {'version_id_col': version}
+
     def __init__(self, name, age, zoo_id=None, favorite_monkey_id=None, dream_monkey_id=None):
         self.name = name
         self.age = age
@@ -26,8 +39,7 @@ class ZooKeeper(Base):
         self.dream_monkey_id = dream_monkey_id
 
     def to_dict(self):
-        keys = ['id', 'name', 'age', 'zoo_id', 'favorite_monkey_id', 'dream_monkey_id']
-        return {key: getattr(self, key) for key in keys}
+        return {key: getattr(self, key) for key in ZOO_KEEPER_COLUMNS}
 
     def set_attributes(self, **kwargs):
         """
@@ -1,6 +1,16 @@
+import threading
+import time
+
 import requests
 import json
 
+from zoo_keeper_server.circuit_breaker import CircuitBreakers
+from zoo_keeper_server.deadline import Deadline
+from zoo_keeper_server.lookup_cache import CacheEntry, LookupCache, NotFound
+from zoo_keeper_server.retry_policy import RetryPolicy
+from zoo_keeper_server.single_flight import FlightTimeout, SingleFlight
+from zoo_keeper_server.zoo_service_session import ZooServiceSession, PooledSession
+
 
 class BadResponse(ValueError):
     pass
@@ -10,76 +20,298 @@ class NoResponse(TimeoutError):
     pass
 
 
+class DeadlineCut(NoResponse):
+    """
+    the request's own deadline ended every attempt, each given less than the configured timeout,
+    which says nothing about the zoo service.
+    """
+
+
+class NotSent(DeadlineCut):
+    """
+    the deadline ran out before any attempt was sent.
+    """
+
+
 class ZooServiceRequestHandler(object):
-    def __init__(self, zoo_service_url, timeout=2, request_attempts=3):
+    def __init__(self, zoo_service_url, timeout=2, request_attempts=3, session: PooledSession = ZooServiceSession,
+                 cache: LookupCache = None, breakers: CircuitBreakers = None, deadline: Deadline = None,
+                 retry_policy: RetryPolicy = None, flights: SingleFlight = None):
         self.server_url = zoo_service_url
         self.zoo_addr = '{}/zoos/'.format(self.server_url)
         self.monkey_addr = '{}/monkeys/'.format(self.server_url)
         self.timeout = timeout
         self.request_attempts = request_attempts
+        self.session = session
+        self.cache = cache
+        self.breakers = breakers
+        self.deadline = deadline
+        self.retry_policy = retry_policy
+        self.flights = flights
+
+    def handle_request(self, address, use_get=True, headers: dict = None):
+        """
+        with flights, a request made while an identical one is outstanding waits for that one's response
+        or error instead of being sent, for at most the remaining deadline. a DeadlineCut is not shared,
+        as it came from the other request's deadline: the waiting requests are sent again.
+        """
+        if self.flights is None:
+            return self._handle_request(address, use_get, headers)
+        key = (use_get, address, tuple(sorted(headers.items())) if headers else ())
+        timeout = None if self.deadline is None else self.deadline.remaining()
+        try:
+            return self.flights.do(
+                key, lambda: self._handle_request(address, use_get, headers), timeout,
+                is_shared=lambda error: not isinstance(error, DeadlineCut)
+            )
+        except FlightTimeout:
+            raise NoResponse(get_no_response_json(
+                "at address: {}, deadline of {} seconds exceeded waiting for a request in flight".format(
+                    address, self.deadline.budget
+                )
+            ))
+
+    def _handle_request(self, address, use_get=True, headers: dict = None):
+        endpoint_family = self._get_endpoint_family(address)
+        breaker = None
+        if self.breakers is not None:
+            breaker = self.breakers.get(endpoint_family)
+            if not breaker.allow_request():
+                raise NoResponse(get_no_response_json(
+                    "at address: {}, circuit open, not sending request".format(address)
+                ))
 
-    def handle_request(self, address, use_get=True):
+        try:
+            response = self._send_request(address, use_get, endpoint_family, headers)
+        except DeadlineCut:
+            if breaker is not None:
+                breaker.release()
+            raise
+        except Exception:
+            if breaker is not None:
+                breaker.record_failure()
+            raise
+
+        if breaker is not None:
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+        return response
+
+    def _send_request(self, address, use_get, endpoint_family, headers=None):
+        if self.retry_policy is not None:
+            self.retry_policy.record_request(endpoint_family)
         tries = 0
+        full_timeouts = 0
         if use_get:
-            requests_method = requests.get
+            requests_method = self.session.get
         else:
-            requests_method = requests.head
+            requests_method = self.session.head
 
+        kwargs = {} if headers is None else {'headers': headers}
         error_text = ""
         while tries < self.request_attempts:
+            if self.deadline is not None and self.deadline.expired():
+                error_text = "at address: {}, attempts: {}, deadline of {} seconds exceeded".format(
+                    address, tries, self.deadline.budget
+                )
+                if tries == 0:
+                    raise NotSent(get_no_response_json(error_text))
+                break
+            timeout = self._get_timeout()
             try:
-                return requests_method(address, timeout=self.timeout)
+                return requests_method(address, timeout=timeout, **kwargs)
             except requests.exceptions.Timeout:
                 tries += 1
-            except requests.exceptions.ConnectionError as e:
+                if timeout < self.timeout:
+                    error_text = "at address: {}, attempts: {}, deadline of {} seconds exceeded".format(
+                        address, tries, self.deadline.budget
+                    )
+                    if full_timeouts == 0:
+                        raise DeadlineCut(get_no_response_json(error_text))
+                    break
+                full_timeouts += 1
+                if tries < self.request_attempts and not self._wait_to_retry(endpoint_family, tries):
+                    error_text = "at address: {}, attempts: {}, retry budget exhausted".format(address, tries)
+                    break
+            except requests.exceptions.RequestException as e:
                 error_text = str(e)
                 break
         if not error_text:
             error_text = "at address: {}, attempts: {}, timeout after: {} seconds".format(
                 address, self.request_attempts, self.timeout
             )
-        info = {
-            "error": 504,
-            "title": "gateway timeout",
-            "error_type": "NoResponse",
-            "text": error_text
-        }
-        raise NoResponse(json.dumps(info))
+        raise NoResponse(get_no_response_json(error_text))
+
+    def _wait_to_retry(self, endpoint_family, retry_number) -> bool:
+        """
+        :return: False if the retry budget is spent
+        """
+        if self.retry_policy is None:
+            return True
+        if not self.retry_policy.try_retry(endpoint_family):
+            return False
+        delay = self.retry_policy.get_delay(retry_number)
+        if self.deadline is not None:
+            delay = min(delay, self.deadline.remaining())
+        time.sleep(delay)
+        return True
+
+    def _get_timeout(self):
+        if self.deadline is None:
+            return self.timeout
+        return self.deadline.get_timeout(self.timeout)
+
+    def _get_endpoint_family(self, address):
+        for family_address in (self.zoo_addr, self.monkey_addr):
+            if address.startswith(family_address):
+                return family_address
+        return address
 
     def get_all_monkeys(self) -> dict:
         request = self.handle_request(self.monkey_addr)
         _check_response(request)
-        return request.json()
+        return self._cache_all('monkey', request.json())
 
     def get_all_zoos(self) -> dict:
         request = self.handle_request(self.zoo_addr)
         _check_response(request)
-        return request.json()
+        return self._cache_all('zoo', request.json())
 
     def get_monkey(self, monkey_id: int) -> dict:
-        request = self.handle_request(self.monkey_addr + str(monkey_id))
-        _check_response(request)
-        return request.json()
+        return self._get_record('monkey', self.monkey_addr, monkey_id)
 
     def get_zoo(self, zoo_id: int) -> dict:
-        request = self.handle_request(self.zoo_addr + str(zoo_id))
-        _check_response(request)
-        return request.json()
+        return self._get_record('zoo', self.zoo_addr, zoo_id)
 
     def has_zoo(self, zoo_id: int) -> bool:
-        request = self.handle_request(self.zoo_addr + str(zoo_id), use_get=False)
-        return request.ok
+        return self._has_record('zoo', self.zoo_addr, zoo_id)
 
     def has_monkey(self, monkey_id: int) -> bool:
-        request = self.handle_request(self.monkey_addr + str(monkey_id), use_get=False)
-        return request.ok
+        return self._has_record('monkey', self.monkey_addr, monkey_id)
 
     def is_monkey_in_zoo(self, monkey_id: int, zoo_id: int) -> bool:
-        request = self.handle_request(self.monkey_addr + str(monkey_id))
-        _check_response(request)
-        test_json = request.json()
+        test_json = self.get_monkey(monkey_id)
         return test_json['zoo_id'] == zoo_id
 
+    def _get_record(self, entity, address, record_id) -> dict:
+        """
+        an expired cached record within the cache's stale_while_revalidate window is returned at once,
+        while a background thread refreshes it.
+        """
+        stale = None
+        if self.cache is not None:
+            cached = self.cache.get(entity, record_id)
+            if isinstance(cached, NotFound):
+                raise BadResponse(cached.error_text)
+            if cached is not None:
+                return cached
+            stale = self.cache.get_stale(entity, record_id)
+            if stale is not None and self.cache.can_serve_while_revalidating(stale):
+                self._refresh_in_background(entity, address, record_id, stale)
+                return stale.value
+        return self._fetch_record(entity, address, record_id, stale)
+
+    def _fetch_record(self, entity, address, record_id, stale: CacheEntry = None) -> dict:
+        """
+        an expired cached record that came with an ETag or Last-Modified is revalidated with a conditional GET.
+        a 304 keeps the cached record for another TTL, without a body to download or parse.
+        if the zoo service does not answer or fails with a 5xx, an expired record within the cache's
+        stale_if_error window is returned with "stale": true.
+
+        :raise: BadResponse, NoResponse
+        """
+        headers = stale.validators if stale is not None and stale.validators else None
+        try:
+            request = self.handle_request(address + str(record_id), headers=headers)
+        except NoResponse:
+            if stale is not None and self.cache.can_serve_on_error(stale):
+                return _mark_stale(stale.value)
+            raise
+        if stale is not None and request.status_code == 304:
+            self.cache.set(entity, record_id, stale.value, validators=stale.validators)
+            return stale.value
+        if stale is not None and request.status_code >= 500 and self.cache.can_serve_on_error(stale):
+            return _mark_stale(stale.value)
+        try:
+            _check_response(request)
+        except BadResponse as e:
+            if self.cache is not None and request.status_code == 404:
+                self.cache.set_not_found(entity, record_id, e.args[0])
+            raise
+        record = request.json()
+        if self.cache is not None:
+            self.cache.set(entity, record_id, record, validators=_get_validators(request))
+        return record
+
+    def _refresh_in_background(self, entity, address, record_id, stale: CacheEntry):
+        """
+        at most one refresh per record runs at a time. it has no deadline, as it outlives the request.
+        """
+        if not self.cache.start_refresh(entity, record_id):
+            return
+        refresher = ZooServiceRequestHandler(
+            self.server_url, self.timeout, self.request_attempts, self.session, self.cache, self.breakers,
+            retry_policy=self.retry_policy, flights=self.flights
+        )
+
+        def refresh():
+            try:
+                refresher._fetch_record(entity, address, record_id, stale)
+            except (BadResponse, NoResponse):
+                pass
+            finally:
+                self.cache.finish_refresh(entity, record_id)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _has_record(self, entity, address, record_id) -> bool:
+        """
+        without a cache this is a HEAD request. with one, the record is fetched and cached so that
+        a following get_* or is_monkey_in_zoo needs no request at all.
+        """
+        if self.cache is None:
+            request = self.handle_request(address + str(record_id), use_get=False)
+            return request.ok
+        try:
+            self._get_record(entity, address, record_id)
+            return True
+        except BadResponse:
+            return False
+
+    def _cache_all(self, entity, records: list) -> list:
+        if self.cache is not None:
+            for record in records:
+                self.cache.set(entity, record['id'], record)
+        return records
+
+
+def get_no_response_json(error_text) -> str:
+    info = {
+        "error": 504,
+        "title": "gateway timeout",
+        "error_type": "NoResponse",
+        "text": error_text
+    }
+    return json.dumps(info)
+
+
+def _mark_stale(record: dict) -> dict:
+    return dict(record, stale=True)
+
+
+def _get_validators(request: requests.models.Response) -> dict:
+    """
+    :return: the conditional request headers that revalidate this response
+    """
+    validators = {}
+    if request.headers.get('ETag'):
+        validators['If-None-Match'] = request.headers['ETag']
+    if request.headers.get('Last-Modified'):
+        validators['If-Modified-Since'] = request.headers['Last-Modified']
+    return validators
+
 
 def _check_response(request: requests.models.Response):
     if not request.ok:
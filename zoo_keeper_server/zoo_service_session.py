@@ -0,0 +1,73 @@
+"""
+NOTE: ZooServiceSession is shared by every ZooServiceRequestHandler in the process.
+Pool sizes are set with ZooServiceSession.configure(...) before serving requests.
+"""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PooledSession(object):
+    """
+    A keep-alive requests.Session whose connections are dropped after sitting idle.
+
+    :param pool_connections: number of per-host connection pools to keep
+    :param pool_maxsize: maximum connections kept open per host
+    :param idle_timeout: seconds without a request before pooled connections are closed
+    """
+    def __init__(self, pool_connections=10, pool_maxsize=10, idle_timeout=60):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.idle_timeout = idle_timeout
+
+        self._session = None
+        self._last_used = 0.
+        self._lock = threading.Lock()
+
+    def configure(self, pool_connections=None, pool_maxsize=None, idle_timeout=None):
+        with self._lock:
+            if pool_connections is not None:
+                self.pool_connections = pool_connections
+            if pool_maxsize is not None:
+                self.pool_maxsize = pool_maxsize
+            if idle_timeout is not None:
+                self.idle_timeout = idle_timeout
+            self._close_session()
+
+    def get(self, address, **kwargs) -> requests.Response:
+        return self._get_session().get(address, **kwargs)
+
+    def head(self, address, **kwargs) -> requests.Response:
+        return self._get_session().head(address, **kwargs)
+
+    def close(self):
+        with self._lock:
+            self._close_session()
+
+    def _get_session(self) -> requests.Session:
+        with self._lock:
+            now = time.monotonic()
+            if self._session is not None and now - self._last_used > self.idle_timeout:
+                self._close_session()
+            if self._session is None:
+                self._session = self._create_session()
+            self._last_used = now
+            return self._session
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _close_session(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+ZooServiceSession = PooledSession()